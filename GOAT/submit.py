@@ -4,6 +4,7 @@ import zipfile
 import re
 import torch
 import time
+import json
 from tqdm import tqdm
 
 EXPECTED_RANGE_ONE = set(range(0, 300))  # 0000 to 0299
@@ -237,6 +238,7 @@ def challenge2(model_path, team_id, password, wait_for_result=True):
             f"{GPU_API_URL}/submit/task2",
             files=files,
             data={'team_token': token},
+            headers={'Authorization': f'Bearer {token}'},
             timeout=60
         )
         wrapped_file.close()
@@ -244,6 +246,15 @@ def challenge2(model_path, team_id, password, wait_for_result=True):
         raise Exception(f"Upload failed: {e}")
     
     # ---------- Handle Response ----------
+    if resp.status_code == 429 and 'Retry-After' in resp.headers:
+        print(f"\n⏳ Too many submissions. Please retry in {resp.headers['Retry-After']} seconds.")
+        return None
+    
+    if resp.status_code == 503 and 'Retry-After' in resp.headers:
+        retry_minutes = int(resp.headers['Retry-After']) / 60
+        print(f"\n⏳ The evaluation queue is full. Please retry in about {retry_minutes:.0f} minutes.")
+        return None
+    
     if resp.status_code != 202:
         print(f"\n❌ Submission Failed: {resp.text}")
         return None
@@ -255,6 +266,8 @@ def challenge2(model_path, team_id, password, wait_for_result=True):
     print(f"\n✅ Submission Queued Successfully!")
     print(f"🆔 Submission ID: {submission_id}")
     print(f"📊 Queue Position: {queue_position}")
+    if result.get('estimated_wait_seconds') is not None:
+        print(f"⏱️  Estimated wait: ~{result['estimated_wait_seconds'] / 60:.1f} min")
     
     # ---------- Wait for Results or Exit ----------
     if not wait_for_result:
@@ -274,9 +287,96 @@ def challenge2(model_path, team_id, password, wait_for_result=True):
     return _poll_for_results(GPU_API_URL, submission_id, team_id)
 
 
+def _progress_for(data):
+    """Progress bar value (0-100) for a status payload"""
+    state = data.get('state') or data.get('status')
+    if state == 'pass':
+        progress = data.get('progress') or {}
+        passes = progress.get('passes') or 5
+        return 30 + int(60 * (progress.get('pass') or 0) / passes)
+    return {
+        'queued': 10,
+        'loading': 20,
+        'warmup': 30,
+        'processing': 50,
+        'scoring': 95,
+        'completed': 100,
+        'done': 100,
+    }.get(state, 10)
+
+
+def _print_final_result(data, team_id):
+    """Print a finished evaluation; returns the payload"""
+    if data.get('status') == 'failed':
+        error = data.get('error', 'Unknown error')
+        print(f"\n\n❌ Evaluation Failed!")
+        print(f"Error: {error}")
+        return data
+    
+    score = data.get('score', 0)
+    details = data.get('details', {})
+    
+    print(f"\n\n🎉 Evaluation Complete!")
+    print(f"📊 Final Score: {score:.2f}")
+    print(f"\n📈 Details:")
+    print(f"   • Inference Time: {details.get('inference_time', 0):.4f}s")
+    print(f"   • Throughput: {details.get('throughput_samples_per_sec', 0):.2f} samples/sec")
+    print(f"   • Model Size: {details.get('model_size_mb', 0):.2f} MB")
+    
+    # Get leaderboard position
+    try:
+        lb_response = requests.get(f"{CPU_API_URL}/leaderboard/task2?team_name={team_id}")
+        if lb_response.status_code == 200:
+            leaderboard = lb_response.json()
+            for entry in leaderboard:
+                if entry['team_name'] == team_id:
+                    print(f"\n🏆 Your Rank: #{entry['rank']}")
+                    break
+    except:
+        pass
+    
+    print(f"\n✅ View full leaderboard at: {CPU_API_URL.replace('/api', '')}/")
+    return data
+
+
+def _stream_events(gpu_url, submission_id, deadline, on_status):
+    """
+    Follow the server-sent event stream of a submission.
+    Returns the final result, or None if the stream is unavailable or ends early.
+    """
+    try:
+        with requests.get(
+            f"{gpu_url}/submit/task2/events/{submission_id}",
+            stream=True,
+            timeout=(10, 60),
+            headers={'Accept': 'text/event-stream'}
+        ) as response:
+            if response.status_code != 200:
+                return None
+            
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if time.time() > deadline:
+                    return None
+                if line.startswith('event:'):
+                    event = line[len('event:'):].strip()
+                elif line.startswith('data:'):
+                    data = json.loads(line[len('data:'):])
+                    if event == 'result':
+                        return data
+                    on_status(data)
+    except (requests.exceptions.RequestException, ValueError):
+        pass
+    return None
+
+
 def _poll_for_results(gpu_url, submission_id, team_id, max_wait_minutes=15):
     """
-    Poll GPU server for evaluation results
+    Wait for evaluation results from the GPU server
+    
+    Follows the submission's event stream; if that is unavailable, falls back to
+    long-polling the status endpoint, and to plain polling with exponential
+    backoff (1s up to 30s) against servers that answer immediately.
     
     Args:
         gpu_url: GPU server base URL
@@ -287,81 +387,53 @@ def _poll_for_results(gpu_url, submission_id, team_id, max_wait_minutes=15):
     Returns:
         dict: Final result with score
     """
-    max_attempts = max_wait_minutes * 60  # 1 attempt per second
-    attempt = 0
-    last_status = None
+    deadline = time.time() + max_wait_minutes * 60
     
     try:
         with tqdm(total=100, desc="Processing", unit="%", bar_format='{l_bar}{bar}| {elapsed}') as pbar:
-            while attempt < max_attempts:
+            def on_status(data):
+                pbar.n = _progress_for(data)
+                pbar.refresh()
+                position = data.get('queue_position')
+                if position:
+                    pbar.set_postfix_str(f"queue position {position}")
+                else:
+                    pbar.set_postfix_str(data.get('state', ''))
+            
+            data = _stream_events(gpu_url, submission_id, deadline, on_status)
+            if data is not None:
+                pbar.n = 100
+                pbar.refresh()
+                return _print_final_result(data, team_id)
+            
+            delay = 1
+            while time.time() < deadline:
+                started = time.time()
                 try:
                     response = requests.get(
                         f"{gpu_url}/submit/task2/status/{submission_id}",
-                        timeout=10
+                        params={'wait': 30},
+                        timeout=40
                     )
                     
                     if response.status_code == 200:
-                        data = response.json()
-                        status = data.get('status', 'processing')
-                        
-                        # Update progress bar on status change
-                        if status != last_status:
-                            if status == 'queued':
-                                pbar.n = 10
-                            elif status == 'processing':
-                                pbar.n = 50
-                            elif status == 'completed':
-                                pbar.n = 100
-                            pbar.refresh()
-                            last_status = status
-                        
-                        if status == 'completed':
-                            score = data.get('score', 0)
-                            details = data.get('details', {})
-                            
-                            print(f"\n\n🎉 Evaluation Complete!")
-                            print(f"📊 Final Score: {score:.2f}")
-                            print(f"\n📈 Details:")
-                            print(f"   • Inference Time: {details.get('inference_time', 0):.4f}s")
-                            print(f"   • Throughput: {details.get('throughput_samples_per_sec', 0):.2f} samples/sec")
-                            print(f"   • Model Size: {details.get('model_size_mb', 0):.2f} MB")
-                            
-                            # Get leaderboard position
-                            try:
-                                lb_response = requests.get(f"{CPU_API_URL}/leaderboard/task2?team_name={team_id}")
-                                if lb_response.status_code == 200:
-                                    leaderboard = lb_response.json()
-                                    for entry in leaderboard:
-                                        if entry['team_name'] == team_id:
-                                            print(f"\n🏆 Your Rank: #{entry['rank']}")
-                                            break
-                            except:
-                                pass
-                            
-                            print(f"\n✅ View full leaderboard at: {CPU_API_URL.replace('/api', '')}/")
-                            return data
-                        
-                        elif status == 'failed':
-                            error = data.get('error', 'Unknown error')
-                            print(f"\n\n❌ Evaluation Failed!")
-                            print(f"Error: {error}")
-                            return data
-                        
-                        # Still processing
-                        queue_length = data.get('queue_length', 0)
-                        if queue_length > 0 and attempt % 10 == 0:
-                            print(f"\r⏳ Queue length: {queue_length}     ", end='', flush=True)
+                        pbar.n = 100
+                        pbar.refresh()
+                        return _print_final_result(response.json(), team_id)
                     
-                    elif response.status_code == 202:
-                        # Still in queue/processing
-                        pass
+                    if response.status_code == 202:
+                        on_status(response.json())
                     
                 except requests.exceptions.RequestException:
                     # Network error, continue polling
                     pass
                 
-                time.sleep(1)
-                attempt += 1
+                if time.time() - started < 1:
+                    # The server didn't hold the request - back off instead of polling in a tight loop
+                    time.sleep(delay)
+                    delay = min(delay * 2, 30)
+                else:
+                    delay = 1
             
             # Timeout
             print(f"\n\n⏱️  Polling timeout after {max_wait_minutes} minutes")
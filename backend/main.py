@@ -2,10 +2,12 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from . import models, database
+from .http_client import http_client
 from .routers import auth, submissions, leaderboard, admin, teams, qa, gpu_callback
 
 # Create tables
 models.Base.metadata.create_all(bind=database.engine)
+models.upgrade_submission_columns(database.engine)
 
 app = FastAPI(title="MLS-GOAT Hackathon Backend")
 gpu_server_ip = "https://revolution-imports-thereof-accountability.trycloudflare.com"
@@ -35,6 +37,10 @@ async def startup_event():
         print(f"WARNING: Ground Truth directory not found at {gt_path}. Task 1 scoring will fail.")
         os.makedirs(gt_path, exist_ok=True) 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await http_client.aclose()
+
 @app.get("/gpu-server-ip")
 def get_gpu_server_ip():
     global gpu_server_ip
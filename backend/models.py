@@ -1,8 +1,24 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, func, inspect, text
 from sqlalchemy.orm import relationship
 import datetime
+import json
+import logging
 from .database import Base
 
+logger = logging.getLogger(__name__)
+
+# Hot detail fields promoted to typed columns: details key -> Submission column
+SUBMISSION_DETAIL_COLUMNS = {
+    "status": "status",
+    "submission_id": "external_submission_id",
+    "inference_time": "inference_time",
+    "model_size_mb": "model_size_mb",
+    "rmse": "rmse",
+    "average_psnr": "psnr",
+    "average_ssim": "ssim",
+    "average_sam": "sam",
+}
+
 class Team(Base):
     __tablename__ = "teams"
 
@@ -24,11 +40,43 @@ class Submission(Base):
     filename = Column(String)
     public_score = Column(Float, default=0.0)
     private_score = Column(Float, default=0.0)
-    details = Column(String, default="{}") # JSON string for extra details like accuracy, size, time
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
 
+    # Structured detail fields (see SUBMISSION_DETAIL_COLUMNS)
+    status = Column(String, index=True) # queued / completed / failed (Task 2)
+    external_submission_id = Column(String, unique=True, index=True) # GPU server submission id
+    inference_time = Column(Float, index=True)
+    model_size_mb = Column(Float)
+    rmse = Column(Float)
+    psnr = Column(Float)
+    ssim = Column(Float)
+    sam = Column(Float)
+    # Free-form remainder of the details, as a JSON string
+    extra_details = Column("details", String, default="{}")
+
     team = relationship("Team", back_populates="submissions")
 
+    @property
+    def details(self):
+        """Full details as a JSON string (structured columns merged back into the remainder)"""
+        merged = json.loads(self.extra_details or "{}")
+        for key, column in SUBMISSION_DETAIL_COLUMNS.items():
+            value = getattr(self, column)
+            if value is not None:
+                merged[key] = value
+        return json.dumps(merged)
+
+    @details.setter
+    def details(self, value):
+        """Accepts a dict or JSON string; hot fields go to their columns, the rest stays JSON"""
+        remainder = json.loads(value) if isinstance(value, str) else dict(value or {})
+        for key, column in SUBMISSION_DETAIL_COLUMNS.items():
+            setattr(self, column, remainder.pop(key, None))
+        self.extra_details = json.dumps(remainder)
+
+    def details_dict(self):
+        return json.loads(self.details)
+
 class LeaderboardSettings(Base):
     __tablename__ = "leaderboard_settings"
     
@@ -61,3 +109,97 @@ class Answer(Base):
     
     question = relationship("Question", back_populates="answers")
     author = relationship("Team", back_populates="answers")
+
+
+def upgrade_submission_columns(engine):
+    """
+    Add the structured Submission columns to databases created before they existed
+    and backfill them from the JSON details (create_all never alters existing tables)
+    """
+    existing = {col["name"] for col in inspect(engine).get_columns(Submission.__tablename__)}
+    missing = [c for c in Submission.__table__.columns if c.name not in existing]
+    if missing:
+        with engine.begin() as conn:
+            for column in missing:
+                column_type = column.type.compile(dialect=engine.dialect)
+                try:
+                    conn.execute(text(f"ALTER TABLE submissions ADD COLUMN {column.name} {column_type}"))
+                except Exception as e:
+                    # Another worker process may have added it concurrently
+                    logger.warning(f"Could not add column submissions.{column.name}: {e}")
+        _backfill_submission_columns()
+
+    _ensure_submission_indexes(engine)
+
+
+def _backfill_submission_columns():
+    from .database import SessionLocal
+    db = SessionLocal()
+    try:
+        rows = db.query(Submission).filter(Submission.status.is_(None), Submission.extra_details != "{}").all()
+        for sub in rows:
+            try:
+                sub.details = sub.extra_details
+            except (ValueError, TypeError):
+                continue
+        db.commit()
+        logger.info(f"Backfilled structured details for {len(rows)} submissions")
+    finally:
+        db.close()
+
+
+def _dedupe_external_submission_ids():
+    """
+    Keep each GPU submission id on a single row so it can be indexed as unique.
+    Older versions could record one id on several rows; the row holding its
+    final result (else the newest) keeps it, the others keep it only in their
+    JSON details as legacy_submission_id.
+    """
+    from .database import SessionLocal
+    db = SessionLocal()
+    try:
+        duplicated = [
+            row[0] for row in db.query(Submission.external_submission_id)
+            .filter(Submission.external_submission_id.isnot(None))
+            .group_by(Submission.external_submission_id)
+            .having(func.count(Submission.id) > 1)
+        ]
+        for external_id in duplicated:
+            rows = db.query(Submission).filter(
+                Submission.external_submission_id == external_id
+            ).order_by(Submission.id.desc()).all()
+            keep = next((sub for sub in rows if sub.status in ("completed", "failed")), rows[0])
+            for sub in rows:
+                if sub is keep:
+                    continue
+                extra = json.loads(sub.extra_details or "{}")
+                extra["legacy_submission_id"] = external_id
+                sub.extra_details = json.dumps(extra)
+                sub.external_submission_id = None
+        db.commit()
+        if duplicated:
+            logger.warning(f"Removed duplicate external submission ids from older rows: {duplicated}")
+    finally:
+        db.close()
+
+
+def _ensure_submission_indexes(engine):
+    """Create missing Submission indexes, upgrading ones that should now be unique"""
+    existing = {ix["name"]: ix for ix in inspect(engine).get_indexes(Submission.__tablename__)}
+    for index in Submission.__table__.indexes:
+        current = existing.get(index.name)
+        if current is not None and bool(current["unique"]) == bool(index.unique):
+            continue
+        if index.unique and "external_submission_id" in index.columns:
+            _dedupe_external_submission_ids()
+        try:
+            with engine.begin() as conn:
+                if current is not None:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+                index.create(bind=conn)
+        except Exception as e:
+            # Fine if another worker process created it concurrently, fatal otherwise
+            created = {ix["name"]: ix for ix in inspect(engine).get_indexes(Submission.__tablename__)}.get(index.name)
+            if created is None or bool(created["unique"]) != bool(index.unique):
+                logger.error(f"Could not create index {index.name}: {e}")
+                raise RuntimeError(f"Could not create index {index.name} on submissions: {e}") from e
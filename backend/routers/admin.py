@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from .. import models, schemas, database, utils
-import requests
+from ..http_client import http_client
+import httpx
 import os
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -159,16 +160,45 @@ async def create_teams_batch(
         "errors": errors
     }
 
+SUBMISSION_SORT_COLUMNS = {
+    "timestamp": models.Submission.timestamp,
+    "public_score": models.Submission.public_score,
+    "private_score": models.Submission.private_score,
+    "inference_time": models.Submission.inference_time,
+    "model_size_mb": models.Submission.model_size_mb,
+    "rmse": models.Submission.rmse,
+    "psnr": models.Submission.psnr,
+}
+
 @router.get("/submissions", response_model=List[schemas.SubmissionResult])
 def get_all_submissions(
     skip: int = 0, 
     limit: int = 300,
+    task_id: Optional[int] = None,
+    status: Optional[str] = None,
+    team_id: Optional[int] = None,
+    sort_by: str = "timestamp",
+    order: str = "desc",
     db: Session = Depends(database.get_db),
     current_admin: models.Team = Depends(utils.get_current_admin)
 ):
-    """Get all submissions (admin only)"""
-    submissions = db.query(models.Submission)\
-        .order_by(models.Submission.timestamp.desc())\
+    """Get all submissions, optionally filtered by task/status/team and sorted by a metric (admin only)"""
+    if sort_by not in SUBMISSION_SORT_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of {list(SUBMISSION_SORT_COLUMNS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    
+    query = db.query(models.Submission)
+    if task_id is not None:
+        query = query.filter(models.Submission.task_id == task_id)
+    if status is not None:
+        query = query.filter(models.Submission.status == status)
+    if team_id is not None:
+        query = query.filter(models.Submission.team_id == team_id)
+    
+    sort_column = SUBMISSION_SORT_COLUMNS[sort_by]
+    sort_column = sort_column.asc() if order == "asc" else sort_column.desc()
+    submissions = query.order_by(sort_column.nullslast())\
         .offset(skip).limit(limit).all()
     return submissions
 
@@ -220,8 +250,7 @@ def update_leaderboard_settings(
     return settings
 
 @router.post("/calculate-private-leaderboard")
-def calculate_private_leaderboard(
-    db: Session = Depends(database.get_db),
+async def calculate_private_leaderboard(
     current_admin: models.Team = Depends(utils.get_current_admin)
 ):
     """
@@ -233,7 +262,7 @@ def calculate_private_leaderboard(
         raise HTTPException(status_code=500, detail="GPU_SCORER_SECRET_KEY not configured")
     
     try:
-        response = requests.post(
+        response = await http_client.post(
             f"{GPU_SERVER_URL}/submit/calculate-private-leaderboard",
             headers={"X-GPU-Secret": GPU_SCORER_SECRET_KEY},
             timeout=30.0
@@ -247,7 +276,9 @@ def calculate_private_leaderboard(
         
         return response.json()
         
-    except requests.RequestException as e:
+    except HTTPException:
+        raise
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=503,
             detail=f"Failed to connect to GPU server: {str(e)}"
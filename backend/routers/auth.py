@@ -17,7 +17,7 @@ def login(request: LoginRequest, db: Session = Depends(database.get_db)):
     if not utils.verify_password(request.password, team.password_hash):
         raise HTTPException(status_code=400, detail="Incorrect team name or password")
     
-    access_token = utils.create_access_token_simple(team.id)
+    access_token = utils.create_access_token_simple(team.id, team.name)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=schemas.TeamInfo)
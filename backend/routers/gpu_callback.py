@@ -1,9 +1,8 @@
 """GPU callback endpoints - receive results from GPU server"""
 
 from fastapi import APIRouter, Depends, HTTPException, Header, Request
-from sqlalchemy.orm import Session
 from .. import models, database
-import json
+from sqlalchemy.exc import IntegrityError
 import os
 
 router = APIRouter(prefix="/gpu-callback", tags=["gpu-callback"])
@@ -20,10 +19,131 @@ def verify_gpu_secret(x_gpu_secret: str = Header(...)):
     return True
 
 
+RESULT_STATUSES = ('completed', 'failed')
+
+
+def validate_result(data):
+    """Why a result payload can't be applied, None if it is well-formed"""
+    if not isinstance(data, dict):
+        return "result must be an object"
+    if not isinstance(data.get('submission_id'), str) or not data['submission_id']:
+        return "submission_id must be a non-empty string"
+    if data.get('status') not in RESULT_STATUSES:
+        return f"status must be one of {RESULT_STATUSES}, got {data.get('status')!r}"
+    score = data.get('score')
+    if score is not None and (isinstance(score, bool) or not isinstance(score, (int, float))):
+        return "score must be a number or null"
+    team_id = data.get('team_id')
+    if team_id is not None and not (type(team_id) is int or (isinstance(team_id, str) and team_id.isdigit())):
+        return "team_id must be an integer or null"
+    if not isinstance(data.get('details') or {}, dict):
+        return "details must be an object"
+    for field in ('original_submission_id', 'filename', 'error'):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f"{field} must be a string or null"
+    return None
+
+
+def find_by_external_id(session, external_submission_id):
+    """Point lookup of a Task 2 submission by its GPU server submission id (unique index)"""
+    return session.query(models.Submission).filter(
+        models.Submission.external_submission_id == external_submission_id
+    ).first()
+
+
+def record_queued(session, data):
+    """Create the pending row for a queued GPU submission, or return it if already recorded"""
+    submission_id = data['submission_id']
+    
+    sub = find_by_external_id(session, submission_id)
+    if sub:
+        return sub
+    
+    sub = models.Submission(
+        team_id=data['team_id'],
+        task_id=data['task_id'],
+        filename=data['filename'],
+        public_score=0.0,
+        private_score=0.0,
+        details={
+            "status": "queued",
+            "submission_id": submission_id
+        }
+    )
+    session.add(sub)
+    session.flush()
+    return sub
+
+
+def apply_result(session, data):
+    """
+    Upsert a GPU evaluation result onto its submission row.
+    Idempotent: replaying the same callback leaves the row unchanged.
+    
+    Private re-evaluations carry their own submission id; they are matched to the
+    public submission they re-evaluate through `original_submission_id`.
+    """
+    submission_id = data['submission_id']
+    status = data['status']
+    score = data.get('score') or 0.0  # null for a non-finite score
+    details = data.get('details', {})
+    is_private = data.get('is_private', False)
+    
+    if is_private:
+        submission = find_by_external_id(session, data.get('original_submission_id') or submission_id)
+        if not submission:
+            raise HTTPException(status_code=404, detail=f"Submission not found for private result {submission_id}")
+        
+        merged = submission.details_dict()
+        merged["private_submission_id"] = submission_id
+        if status == 'completed':
+            submission.private_score = score
+            merged["private_details"] = details
+            merged.pop("private_error", None)
+        else:
+            merged["private_error"] = data.get('error') or 'Unknown error'
+        submission.details = merged
+        return submission
+    
+    submission = find_by_external_id(session, submission_id)
+    if not submission:
+        # The submission-queued notification never arrived - create the row now
+        submission = record_queued(session, {
+            'submission_id': submission_id,
+            'team_id': data.get('team_id'),
+            'task_id': 2,
+            'filename': data.get('filename') or f"{submission_id}.onnx"
+        })
+    
+    # Update with results
+    if status == 'completed':
+        submission.public_score = score
+        submission.details = {
+            "status": "completed",
+            "submission_id": submission_id,
+            **details
+        }
+    else:
+        # Failed
+        submission.details = {
+            "status": "failed",
+            "submission_id": submission_id,
+            "error": data.get('error') or 'Unknown error'
+        }
+    return submission
+
+
+async def _write_upsert(fn):
+    """Run an upsert; if a concurrent insert of the same id wins the race on the unique index, retry as an update"""
+    try:
+        return await database.write_async(fn)
+    except IntegrityError:
+        return await database.write_async(fn)
+
+
 @router.post("/submission-queued")
 async def submission_queued(
     request: Request,
-    db: Session = Depends(database.get_db),
     _: bool = Depends(verify_gpu_secret)
 ):
     """
@@ -32,26 +152,7 @@ async def submission_queued(
     """
     data = await request.json()
     
-    submission_id = data['submission_id']
-    team_id = data['team_id']
-    task_id = data['task_id']
-    filename = data['filename']
-    
-    # Create pending submission
-    sub = models.Submission(
-        team_id=team_id,
-        task_id=task_id,
-        filename=filename,
-        public_score=0.0,
-        private_score=0.0,
-        details=json.dumps({
-            "status": "queued",
-            "submission_id": submission_id
-        })
-    )
-    db.add(sub)
-    db.commit()
-    db.refresh(sub)
+    sub = await _write_upsert(lambda session: record_queued(session, data))
     
     return {
         "status": "ok",
@@ -63,7 +164,6 @@ async def submission_queued(
 @router.post("/result")
 async def receive_result(
     request: Request,
-    db: Session = Depends(database.get_db),
     _: bool = Depends(verify_gpu_secret)
 ):
     """
@@ -71,47 +171,57 @@ async def receive_result(
     Update database with scores
     """
     data = await request.json()
+    error = validate_result(data)
+    if error:
+        raise HTTPException(status_code=422, detail=error)
     
-    submission_id = data['submission_id']
-    team_id = data.get('team_id')
-    status = data['status']
-    score = data.get('score', 0)
-    details = data.get('details', {})
-    is_private = data.get('is_private', False)
+    submission = await _write_upsert(lambda session: apply_result(session, data))
     
-    # Find submission by team_id and recent timestamp
-    # (since we don't store submission_id in DB initially)
-    submission = db.query(models.Submission).filter(
-        models.Submission.team_id == team_id,
-        models.Submission.task_id == 2
-    ).order_by(models.Submission.timestamp.desc()).first()
+    return {
+        "status": "ok",
+        "message": "Results recorded",
+        "db_id": submission.id
+    }
+
+
+@router.post("/results")
+async def receive_results_batch(
+    request: Request,
+    _: bool = Depends(verify_gpu_secret)
+):
+    """
+    GPU server sends a batch of evaluation results (coalesced by the worker-side sender)
+    All results are applied in a single transaction
     
-    if not submission:
-        raise HTTPException(status_code=404, detail="Submission not found")
+    Body: {"results": [<same payload as /result>, ...]}
+    Each result gets its own status: a malformed one is reported as "invalid"
+    and skipped, the others are still recorded.
+    """
+    data = await request.json()
+    results = data.get('results') if isinstance(data, dict) else None
+    if not isinstance(results, list):
+        raise HTTPException(status_code=422, detail="Body must be {\"results\": [...]}")
     
-    # Update with results
-    if status == 'completed':
-        if is_private:
-            submission.private_score = score
-        else:
-            submission.public_score = score
-        submission.details = json.dumps({
-            "status": "completed",
-            "submission_id": submission_id,
-            **details
-        })
-    else:
-        # Failed
-        submission.details = json.dumps({
-            "status": "failed",
-            "submission_id": submission_id,
-            "error": data.get('error', 'Unknown error')
-        })
+    def apply_batch(session):
+        outcome = []
+        for item in results:
+            error = validate_result(item)
+            if error:
+                submission_id = item.get('submission_id') if isinstance(item, dict) else None
+                outcome.append({"submission_id": submission_id, "status": "invalid", "detail": error})
+                continue
+            try:
+                submission = apply_result(session, item)
+                outcome.append({"submission_id": item['submission_id'], "status": "ok", "db_id": submission.id})
+            except HTTPException as e:
+                # Lookups fail before anything is modified, so the rest of the batch can still commit
+                outcome.append({"submission_id": item.get('submission_id'), "status": "error", "detail": e.detail})
+        return outcome
     
-    db.commit()
+    outcome = await _write_upsert(apply_batch)
     
     return {
         "status": "ok",
-        "message": "Results recorded",
-        "db_id": submission.id
-    }
\ No newline at end of file
+        "message": f"{sum(1 for o in outcome if o['status'] == 'ok')}/{len(results)} results recorded",
+        "results": outcome
+    }
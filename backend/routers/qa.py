@@ -111,14 +111,17 @@ def create_question(
     current_team: models.Team = Depends(utils.get_current_team)
 ):
     """Create a new question"""
-    new_question = models.Question(
-        team_id=current_team.id,
-        title=question.title,
-        content=question.content
-    )
-    db.add(new_question)
-    db.commit()
-    db.refresh(new_question)
+    def add_question(session):
+        new_question = models.Question(
+            team_id=current_team.id,
+            title=question.title,
+            content=question.content
+        )
+        session.add(new_question)
+        session.flush()
+        return new_question
+    
+    new_question = database.write(add_question)
     
     return {
         "id": new_question.id,
@@ -146,14 +149,17 @@ def create_answer(
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
     
-    new_answer = models.Answer(
-        question_id=question_id,
-        team_id=current_team.id,
-        content=answer.content
-    )
-    db.add(new_answer)
-    db.commit()
-    db.refresh(new_answer)
+    def add_answer(session):
+        new_answer = models.Answer(
+            question_id=question_id,
+            team_id=current_team.id,
+            content=answer.content
+        )
+        session.add(new_answer)
+        session.flush()
+        return new_answer
+    
+    new_answer = database.write(add_answer)
     
     return {
         "id": new_answer.id,
@@ -71,19 +71,22 @@ async def submit_task1(file: UploadFile = File(...), db: Session = Depends(datab
     shutil.rmtree(temp_dir, ignore_errors=True)
     
     # Save to DB
-    sub = models.Submission(
-        team_id=current_team.id,
-        task_id=1,
-        filename=file.filename,
-        public_score=score_pb,
-        private_score=score_pr,
-        details=json.dumps(details)
-    )
-    db.add(sub)
-    db.commit()
-    db.refresh(sub)
+    team_id = current_team.id
     
-    return sub
+    def save_submission(session):
+        sub = models.Submission(
+            team_id=team_id,
+            task_id=1,
+            filename=file.filename,
+            public_score=score_pb,
+            private_score=score_pr,
+            details=json.dumps(details)
+        )
+        session.add(sub)
+        session.flush()
+        return sub
+    
+    return await database.write_async(save_submission)
 
 def verify_gpu_secret(x_gpu_secret: str = Header(...)):
     """Verify the GPU secret key"""
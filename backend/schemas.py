@@ -19,7 +19,17 @@ class SubmissionBase(BaseModel):
     task_id: int
     # metrics/details can be passed back in response
 
-class SubmissionResult(SubmissionBase):
+class SubmissionMetrics(BaseModel):
+    status: Optional[str] = None
+    external_submission_id: Optional[str] = None
+    inference_time: Optional[float] = None
+    model_size_mb: Optional[float] = None
+    rmse: Optional[float] = None
+    psnr: Optional[float] = None
+    ssim: Optional[float] = None
+    sam: Optional[float] = None
+
+class SubmissionResult(SubmissionBase, SubmissionMetrics):
     id: int
     team_id: int
     filename: str
@@ -61,7 +71,7 @@ class TeamInfo(BaseModel):
     class Config:
         orm_mode = True
 
-class SubmissionHistory(BaseModel):
+class SubmissionHistory(SubmissionMetrics):
     id: int
     task_id: int
     filename: str
@@ -37,11 +37,15 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def create_access_token_simple(team_id: int):
+def create_access_token_simple(team_id: int, team_name: Optional[str] = None):
     # Simpler wrapper
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    data = {"sub": str(team_id)}
+    if team_name:
+        # Lets the GPU service identify the team without calling back to us
+        data["name"] = team_name
     access_token = create_access_token(
-        data={"sub": str(team_id)}, expires_delta=access_token_expires
+        data=data, expires_delta=access_token_expires
     )
     return access_token
 
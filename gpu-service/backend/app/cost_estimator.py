@@ -0,0 +1,92 @@
+"""Static cost estimate of an uploaded ONNX model: parameter count and FLOPs per sample"""
+
+import os
+import logging
+from math import prod
+
+import onnx
+from onnx import shape_inference
+
+logger = logging.getLogger(__name__)
+
+# Shape of one test sample (CHW); the batch dimension is fixed to 1
+EVAL_INPUT_SHAPE = tuple(int(d) for d in os.getenv('EVAL_INPUT_SHAPE', '3,518,518').split(','))
+
+# Rough cost of ops that are not counted exactly, per output element
+_ELEMENTWISE_FLOPS = 1
+
+
+def _static_shape(value_info):
+    """Concrete dims of a tensor, None if any dim is symbolic or unknown"""
+    dims = value_info.type.tensor_type.shape.dim
+    if not dims or any(not d.HasField('dim_value') for d in dims):
+        return None
+    return [d.dim_value for d in dims]
+
+
+def _fix_input_shape(model):
+    """Pin the first graph input to the evaluation sample shape so shapes can be inferred"""
+    initializers = {init.name for init in model.graph.initializer}
+    for graph_input in model.graph.input:
+        if graph_input.name in initializers:
+            continue
+        dims = graph_input.type.tensor_type.shape.dim
+        target = (1,) + EVAL_INPUT_SHAPE
+        if len(dims) == len(target):
+            for dim, value in zip(dims, target):
+                dim.Clear()
+                dim.dim_value = value
+        return
+
+
+def _node_flops(node, shapes):
+    """FLOPs of one node from its inferred shapes (multiply-add = 2), 0 when shapes are unknown"""
+    out_shape = shapes.get(node.output[0]) if node.output else None
+    if out_shape is None:
+        return 0
+
+    if node.op_type == 'Conv' and len(node.input) > 1:
+        weight = shapes.get(node.input[1])
+        return 2 * prod(out_shape) * prod(weight[1:]) if weight else 0
+
+    if node.op_type == 'ConvTranspose' and len(node.input) > 1:
+        weight = shapes.get(node.input[1])
+        in_shape = shapes.get(node.input[0])
+        return 2 * prod(in_shape) * prod(weight[1:]) if weight and in_shape else 0
+
+    if node.op_type in ('MatMul', 'Gemm'):
+        a = shapes.get(node.input[0])
+        if not a:
+            return 0
+        transposed = node.op_type == 'Gemm' and any(attr.name == 'transA' and attr.i for attr in node.attribute)
+        inner = a[-2] if transposed else a[-1]
+        return 2 * prod(out_shape) * inner
+
+    return _ELEMENTWISE_FLOPS * prod(out_shape)
+
+
+def estimate_model_cost(model_path):
+    """
+    Return {'params': ..., 'flops': ...} for one evaluation sample.
+    FLOPs cover Conv/ConvTranspose/MatMul/Gemm exactly and other ops as one per
+    output element; nodes whose shapes can't be inferred are not counted.
+    """
+    model = onnx.load(model_path, load_external_data=False)
+    params = sum(prod(init.dims) for init in model.graph.initializer)
+
+    _fix_input_shape(model)
+    try:
+        model = shape_inference.infer_shapes(model)
+    except Exception as e:
+        logger.warning(f"Shape inference failed for {model_path}: {e}")
+
+    shapes = {}
+    for value_info in list(model.graph.input) + list(model.graph.value_info) + list(model.graph.output):
+        shape = _static_shape(value_info)
+        if shape is not None:
+            shapes[value_info.name] = shape
+    for init in model.graph.initializer:
+        shapes[init.name] = list(init.dims)
+
+    flops = sum(_node_flops(node, shapes) for node in model.graph.node)
+    return {'params': int(params), 'flops': int(flops)}
@@ -1,7 +1,9 @@
 """Main FastAPI application"""
 
-import requests
+import asyncio
+import httpx
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import logging
@@ -16,7 +18,11 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Import routers
+import model_store
 from app.routers import submissions as submissions
+from app.http_client import http_client
+from app.rate_limit import RateLimitMiddleware
+from app.team_auth import HACKATHON_SECRET_KEY, reconcile_quotas
 
 app = FastAPI(
     title="ONNX Model Evaluation API",
@@ -33,6 +39,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Upload rate limits, applied before the request body is read
+app.add_middleware(RateLimitMiddleware, redis_client=submissions.redis_client)
+
 # Check environment variables
 secret_key = os.getenv("GPU_SCORER_SECRET_KEY")
 cpu_server_url = os.getenv("CPU_SERVER_URL")
@@ -43,27 +52,62 @@ if not secret_key:
 else:
     logger.info(f"✓ GPU_SCORER_SECRET_KEY is set: {secret_key[:10]}...")
 
+if not HACKATHON_SECRET_KEY:
+    logger.warning("HACKATHON_SECRET_KEY not set - team tokens will be verified by the CPU server on every submission")
+else:
+    logger.info("✓ HACKATHON_SECRET_KEY is set: team tokens are verified locally")
+
 if not cpu_server_url:
     logger.warning("CPU_SERVER_URL environment variable not set")
 else:
     logger.info(f"✓ CPU_SERVER_URL is set: {cpu_server_url}")
+        
+# Include routers
+app.include_router(submissions.router, prefix="/submit", tags=["submissions"])
+
+@app.on_event("startup")
+async def check_cpu_server():
+    if not cpu_server_url:
+        return
     # Test connection to CPU server
     try:
         logger.info(f"Testing connection to CPU server at {cpu_server_url}...")
-        response = requests.get(f"{cpu_server_url}/api/health", timeout=5)
+        response = await http_client.get(f"{cpu_server_url}/api/health")
         if response.status_code == 200:
             logger.info(f"✓ CPU server connection successful: {response.json()}")
         else:
             logger.warning(f"⚠ CPU server returned status {response.status_code}")
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         logger.error(f"✗ CPU server connection timeout")
-    except requests.exceptions.ConnectionError as e:
+    except httpx.HTTPError as e:
         logger.error(f"✗ CPU server connection failed: {e}")
     except Exception as e:
         logger.error(f"✗ CPU server connection error: {e}")
-        
-# Include routers
-app.include_router(submissions.router, prefix="/submit", tags=["submissions"])
+
+@app.on_event("startup")
+async def start_quota_reconciler():
+    if submissions.redis_client:
+        asyncio.create_task(reconcile_quotas(submissions.redis_client))
+
+async def collect_model_garbage(redis_client):
+    """Background task: keep the model store within its disk budget"""
+    while True:
+        try:
+            evicted = await run_in_threadpool(model_store.collect_garbage, redis_client, str(submissions.UPLOAD_DIR))
+            if evicted:
+                logger.info(f"Model GC evicted {evicted} model(s): {model_store.stats(redis_client)}")
+        except Exception as e:
+            logger.error(f"Model GC error: {e}")
+        await asyncio.sleep(model_store.MODEL_GC_INTERVAL)
+
+@app.on_event("startup")
+async def start_model_gc():
+    if submissions.redis_client:
+        asyncio.create_task(collect_model_garbage(submissions.redis_client))
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.aclose()
 
 @app.get("/")
 def root():
@@ -0,0 +1,147 @@
+"""Pre-flight validation of uploaded ONNX models on CPU, before they are queued for a GPU worker"""
+
+import asyncio
+import json
+import os
+import sys
+import logging
+from pathlib import Path
+
+from fastapi.concurrency import run_in_threadpool
+import onnx
+from onnx import TensorProto
+
+from app.cost_estimator import EVAL_INPUT_SHAPE
+
+logger = logging.getLogger(__name__)
+
+PREFLIGHT_ENABLED = os.getenv('PREFLIGHT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+PREFLIGHT_TIMEOUT = int(os.getenv('PREFLIGHT_TIMEOUT', 60))  # seconds
+PREFLIGHT_MEMORY_MB = int(os.getenv('PREFLIGHT_MEMORY_MB', 4096))
+
+
+class PreflightError(Exception):
+    """The model can't be evaluated; the message says why"""
+
+
+def _dims(value_info):
+    """Dims of a tensor, with None for symbolic / unknown ones"""
+    return [d.dim_value if d.HasField('dim_value') else None for d in value_info.type.tensor_type.shape.dim]
+
+
+def check_signature(model_path):
+    """Run onnx.checker and validate the graph's input/output signature"""
+    try:
+        onnx.checker.check_model(model_path)
+    except Exception as e:
+        raise PreflightError(f"ONNX checker failed: {str(e).splitlines()[0]}")
+
+    model = onnx.load(model_path, load_external_data=False)
+    initializers = {init.name for init in model.graph.initializer}
+    inputs = [i for i in model.graph.input if i.name not in initializers]
+    if len(inputs) != 1:
+        raise PreflightError(f"Model must have exactly one input, found {len(inputs)}: {[i.name for i in inputs]}")
+    if not model.graph.output:
+        raise PreflightError("Model has no outputs")
+
+    model_input = inputs[0]
+    if model_input.type.tensor_type.elem_type != TensorProto.FLOAT:
+        elem_type = TensorProto.DataType.Name(model_input.type.tensor_type.elem_type)
+        raise PreflightError(f"Input '{model_input.name}' must be float32, got {elem_type}")
+    input_dims = _dims(model_input)
+    if len(input_dims) != 4:
+        raise PreflightError(f"Input '{model_input.name}' must have rank 4 (N, 3, H, W), got shape {input_dims}")
+    if input_dims[1] not in (None, EVAL_INPUT_SHAPE[0]):
+        raise PreflightError(f"Input '{model_input.name}' must have {EVAL_INPUT_SHAPE[0]} channels, got shape {input_dims}")
+    for dim, expected in zip(input_dims[2:], EVAL_INPUT_SHAPE[1:]):
+        if dim not in (None, expected):
+            raise PreflightError(
+                f"Input '{model_input.name}' has shape {input_dims}, test images are {list(EVAL_INPUT_SHAPE[1:])} (H, W)"
+            )
+
+    output = model.graph.output[0]
+    output_dims = _dims(output)
+    if output_dims and not (len(output_dims) == 3 or (len(output_dims) == 4 and output_dims[1] in (None, 1))):
+        raise PreflightError(f"Output '{output.name}' must be a depth map (N, H, W) or (N, 1, H, W), got shape {output_dims}")
+
+    return {'input': model_input.name, 'input_shape': input_dims, 'output': output.name, 'output_shape': output_dims}
+
+
+def dry_run(model_path):
+    """One-sample inference on a CPU-only session; returns the output shape (runs in the subprocess)"""
+    import numpy as np
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+    model_input = session.get_inputs()[0]
+    # Test images are in [0, 1]; a blank image would make per-image standardization divide 0 by 0
+    sample = np.random.default_rng(0).random((1,) + EVAL_INPUT_SHAPE, dtype=np.float32)
+    output = session.run([session.get_outputs()[0].name], {model_input.name: sample})[0]
+
+    shape = list(output.shape)
+    if output.ndim == 4 and shape[1] == 1:
+        spatial = shape[2:]
+    elif output.ndim == 3:
+        spatial = shape[1:]
+    else:
+        raise PreflightError(f"Output must be a depth map (N, H, W) or (N, 1, H, W), got shape {shape}")
+    if shape[0] != 1:
+        raise PreflightError(f"Output batch dimension is {shape[0]} for a batch of 1")
+    if spatial != list(EVAL_INPUT_SHAPE[1:]):
+        raise PreflightError(f"Output depth map is {spatial} (H, W), expected {list(EVAL_INPUT_SHAPE[1:])}")
+    if not np.all(np.isfinite(output)):
+        raise PreflightError("Output contains NaN or Inf for a random input image")
+    return shape
+
+
+async def run_preflight(model_path):
+    """
+    Validate a model: checker and signature in-process, then a dry run in a
+    subprocess (so a crashing or hanging model can't take the API down).
+    Raises PreflightError with a precise reason.
+    """
+    signature = await run_in_threadpool(check_signature, model_path)
+
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, '-m', 'app.preflight', str(model_path),
+        cwd=str(Path(__file__).resolve().parent.parent),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), PREFLIGHT_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise PreflightError(f"Dry run on one sample did not finish within {PREFLIGHT_TIMEOUT}s")
+
+    try:
+        result = json.loads(stdout.decode().strip().splitlines()[-1])
+    except (ValueError, IndexError):
+        logger.warning(f"Pre-flight subprocess for {model_path} exited with {process.returncode}: {stderr.decode()[-500:]}")
+        raise PreflightError(f"Dry run crashed (exit code {process.returncode})")
+    if not result['ok']:
+        raise PreflightError(result['error'])
+
+    signature['dry_run_output_shape'] = result['output_shape']
+    return signature
+
+
+def _main(model_path):
+    """Subprocess entry point: prints one JSON line with the dry run's outcome"""
+    import resource
+    limit = PREFLIGHT_MEMORY_MB * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    try:
+        print(json.dumps({'ok': True, 'output_shape': dry_run(model_path)}))
+    except PreflightError as e:
+        print(json.dumps({'ok': False, 'error': str(e)}))
+    except MemoryError:
+        print(json.dumps({'ok': False, 'error': f"Dry run exceeded {PREFLIGHT_MEMORY_MB}MB of memory"}))
+    except Exception as e:
+        print(json.dumps({'ok': False, 'error': f"Dry run failed: {str(e).splitlines()[0] if str(e) else type(e).__name__}"}))
+
+
+if __name__ == '__main__':
+    _main(sys.argv[1])
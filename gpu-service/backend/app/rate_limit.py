@@ -0,0 +1,153 @@
+"""Redis token-bucket rate limiting of uploads per team and per client IP"""
+
+import hashlib
+import ipaddress
+import os
+import time
+import logging
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from app.team_auth import HACKATHON_SECRET_KEY, bearer_token, decode_team_token
+
+logger = logging.getLogger(__name__)
+
+# Bucket size (burst) and refill rate of each limiter; a rate of 0 disables it.
+# The IP limiter is off by default: behind the tunnel and Docker NAT every team
+# arrives from the same address unless RATE_LIMIT_TRUSTED_PROXIES is set.
+RATE_LIMIT_TEAM_BURST = float(os.getenv('RATE_LIMIT_TEAM_BURST', 5))
+RATE_LIMIT_TEAM_PER_MINUTE = float(os.getenv('RATE_LIMIT_TEAM_PER_MINUTE', 2))
+RATE_LIMIT_IP_BURST = float(os.getenv('RATE_LIMIT_IP_BURST', 10))
+RATE_LIMIT_IP_PER_MINUTE = float(os.getenv('RATE_LIMIT_IP_PER_MINUTE', 0))
+# Peers (IPs or CIDRs, comma-separated) allowed to report the client IP in
+# CF-Connecting-IP / X-Forwarded-For, e.g. the cloudflared container's network
+RATE_LIMIT_TRUSTED_PROXIES = [
+    ipaddress.ip_network(proxy.strip(), strict=False)
+    for proxy in os.getenv('RATE_LIMIT_TRUSTED_PROXIES', '').split(',') if proxy.strip()
+]
+
+# Requests subject to rate limiting: (method, path)
+LIMITED_ROUTES = {('POST', '/submit/task2')}
+
+# Refill the bucket for the time since its last use, then take one token if there is one.
+# Returns {allowed, seconds until a token is available}
+_TOKEN_BUCKET_SCRIPT = """
+local burst, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate)
+
+local allowed, retry_after = 0, (1 - tokens) / rate
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed, retry_after = 1, 0
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+def take_token(redis_client, key, burst, per_minute):
+    """Take one token from a bucket; returns seconds to wait, 0 when allowed"""
+    if per_minute <= 0:
+        return 0
+    bucket_script = redis_client.register_script(_TOKEN_BUCKET_SCRIPT)
+    allowed, retry_after = bucket_script(keys=[key], args=[burst, per_minute / 60, time.time()])
+    return 0 if allowed else float(retry_after)
+
+
+def _team_key(headers):
+    """Rate-limit identity of the team sending a request, from its Authorization header"""
+    token = bearer_token(headers.get(b'authorization', b'').decode('latin-1'))
+    if not token:
+        return None
+
+    if HACKATHON_SECRET_KEY:
+        try:
+            return f"ratelimit:team:{decode_team_token(token)['sub']}"
+        except HTTPException:
+            return None
+    # Without the signing key the token can't be verified - limit it as an opaque identity
+    return f"ratelimit:token:{hashlib.sha256(token.encode()).hexdigest()[:32]}"
+
+
+def _is_trusted_proxy(address):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in RATE_LIMIT_TRUSTED_PROXIES)
+
+
+def client_ip(scope, headers):
+    """
+    IP address of the client sending a request. Forwarding headers are only
+    believed when the peer is a trusted proxy; X-Forwarded-For is walked from
+    the right, skipping trusted hops, so a client can't spoof its own entry.
+    """
+    peer = scope['client'][0] if scope.get('client') else 'unknown'
+    if not _is_trusted_proxy(peer):
+        return peer
+
+    cf_connecting_ip = headers.get(b'cf-connecting-ip', b'').decode('latin-1').strip()
+    if cf_connecting_ip:
+        return cf_connecting_ip
+    forwarded_for = headers.get(b'x-forwarded-for', b'').decode('latin-1')
+    for hop in reversed([hop.strip() for hop in forwarded_for.split(',') if hop.strip()]):
+        if not _is_trusted_proxy(hop):
+            return hop
+    return peer
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying the team and IP token buckets to upload routes.
+
+    It runs before the request body is read, so an over-limit client gets its
+    429 (with Retry-After) without the service receiving the upload. The team is
+    identified from an `Authorization: Bearer <team token>` header, which limited
+    routes require (401 without a valid one, so leaving it out can't dodge the team
+    limit); the handler checks it matches the token it authenticates with. The IP
+    bucket comes on top (see client_ip).
+    """
+
+    def __init__(self, app, redis_client):
+        self.app = app
+        self.redis_client = redis_client
+
+    async def __call__(self, scope, receive, send):
+        if (scope['type'] != 'http' or self.redis_client is None
+                or (scope['method'], scope['path']) not in LIMITED_ROUTES):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope['headers'])
+        team_key = _team_key(headers)
+        if team_key is None:
+            response = JSONResponse(
+                status_code=401,
+                content={'detail': 'An Authorization: Bearer <team token> header is required'},
+                headers={'WWW-Authenticate': 'Bearer'}
+            )
+            return await response(scope, receive, send)
+        buckets = [
+            (f"ratelimit:ip:{client_ip(scope, headers)}", RATE_LIMIT_IP_BURST, RATE_LIMIT_IP_PER_MINUTE),
+            (team_key, RATE_LIMIT_TEAM_BURST, RATE_LIMIT_TEAM_PER_MINUTE),
+        ]
+
+        try:
+            retry_after = max(take_token(self.redis_client, key, burst, rate) for key, burst, rate in buckets)
+        except Exception as e:
+            # Never turn a Redis hiccup into rejected uploads
+            logger.warning(f"Rate limiter unavailable: {e}")
+            retry_after = 0
+
+        if retry_after:
+            response = JSONResponse(
+                status_code=429,
+                content={'detail': 'Too many submissions, slow down'},
+                headers={'Retry-After': str(int(retry_after) + 1)}
+            )
+            return await response(scope, receive, send)
+        await self.app(scope, receive, send)
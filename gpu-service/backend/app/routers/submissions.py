@@ -1,16 +1,36 @@
 """GPU Server - Submissions router with CPU callback"""
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Header
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 import redis
+import redis.asyncio
+import asyncio
+import hashlib
 import json
+import logging
 import os
 import uuid
 import time
-import requests
+from contextlib import aclosing
 from pathlib import Path
 from typing import Optional
 
+import artifact_storage
+import cost_model
+import data_loader
+import job_queue
+import job_state
+import model_store
+import results_store
+from app.cost_estimator import estimate_model_cost
+from app.http_client import http_client
+from app.preflight import PREFLIGHT_ENABLED, PreflightError, run_preflight
+from app.team_auth import authenticate_team, bearer_token, reserve_submission_slot, release_submission_slot
+
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 # Configuration
@@ -22,19 +42,50 @@ GPU_SCORER_SECRET_KEY = os.getenv('GPU_SCORER_SECRET_KEY')
 if not GPU_SCORER_SECRET_KEY:
     raise ValueError("GPU_SCORER_SECRET_KEY environment variable not set")
 
+# Admission control: uploads are refused while the projected queue wait exceeds this (0 disables)
+ADMISSION_MAX_WAIT = int(os.getenv('ADMISSION_MAX_WAIT', 2 * 3600))  # seconds
+
+# Status delivery
+LONG_POLL_MAX_WAIT = int(os.getenv('LONG_POLL_MAX_WAIT', 60))  # seconds
+SSE_MAX_DURATION = int(os.getenv('SSE_MAX_DURATION', 15 * 60))  # seconds
+SSE_KEEPALIVE_INTERVAL = 15  # seconds
+
 # Redis connection
 try:
     redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
     redis_client.ping()
+    job_queue.ensure_consumer_group(redis_client)
 except:
     redis_client = None
 
+if redis_client:
+    try:
+        results_store.migrate_legacy_team_bests(redis_client)
+    except Exception as e:
+        # Best-effort: a failed migration must not make the API report Redis as unavailable
+        logger.error(f"Migrating legacy team bests failed: {e}", exc_info=True)
+
+# Async client, used for pub/sub waits that must not block the event loop
+async_redis_client = redis.asyncio.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+
 # Upload directory
 UPLOAD_DIR = Path("/app/data/uploads")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
-# Test data path - defaults to public test during hackathon
-TEST_DATA_PATH = "/app/data/test_data/public_test"
+MAX_MODEL_SIZE_MB = 100
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+async def notify_submission_queued(notify_data):
+    """Tell the CPU server about a queued submission (non-critical, failures are ignored)"""
+    try:
+        await http_client.post(
+            f"{CPU_SERVER_URL}/api/gpu-callback/submission-queued",
+            json=notify_data,
+            headers={'X-GPU-Secret': GPU_SCORER_SECRET_KEY}
+        )
+    except Exception:
+        pass  # Non-critical, the result callback creates the row if this never arrives
 
 
 @router.get("/health")
@@ -44,59 +95,106 @@ async def health_check():
     return {"status": "ok", "redis": redis_status}
 
 
+async def _store_upload(file):
+    """
+    Copy an upload (already spooled in full by the multipart parser) into the
+    model store, hashing it on the way. Models are stored once per
+    content hash, so a byte-identical resubmission reuses the existing file.
+    The caller gets a job reference on the model (see model_store.add_job_ref)
+    and must release it if the submission is not queued.
+    Returns (model_path, sha256 hex digest, size in bytes).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = UPLOAD_DIR / f".upload_{uuid.uuid4().hex}"
+    try:
+        with open(tmp_path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_MODEL_SIZE_MB * 1024 * 1024:
+                    raise HTTPException(status_code=400, detail=f"Model file too large (max {MAX_MODEL_SIZE_MB}MB)")
+                digest.update(chunk)
+                f.write(chunk)
+        
+        model_hash = digest.hexdigest()
+        model_path = UPLOAD_DIR / f"{model_hash}.onnx"
+        # Registered and referenced before the existence check, so neither GC nor the deletion
+        # of a finished job's model can remove a re-uploaded model while this request uses it
+        model_store.register_artifact(redis_client, model_path, size)
+        while not model_store.add_job_ref(redis_client, model_path):
+            # A deleter claimed the existing copy - store ours once it is gone
+            await asyncio.sleep(0.1)
+        try:
+            if model_path.exists():
+                tmp_path.unlink()
+            else:
+                os.replace(tmp_path, model_path)
+        except Exception:
+            model_store.release_job_ref(redis_client, model_path)
+            raise
+        return model_path, model_hash, size
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def _check_admission():
+    """Refuse new uploads with 503 + Retry-After while the projected queue wait is too long or the model store is full"""
+    if model_store.is_full(redis_client):
+        raise HTTPException(
+            status_code=503,
+            detail="Model storage is full, retry later",
+            headers={"Retry-After": str(model_store.MODEL_GC_INTERVAL)}
+        )
+    if not ADMISSION_MAX_WAIT:
+        return
+    projected_wait = job_queue.estimated_wait(redis_client)
+    if projected_wait > ADMISSION_MAX_WAIT:
+        retry_after = int(projected_wait - ADMISSION_MAX_WAIT) + 1
+        raise HTTPException(
+            status_code=503,
+            detail=f"Evaluation queue is full (projected wait {projected_wait / 60:.0f} min), retry later",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+
 @router.post("/task2")
 async def submit_task2_model(
     file: UploadFile = File(...),
-    team_token: str = Form(...),
+    team_token: Optional[str] = Form(None),
     batch_size: Optional[int] = Form(8),
-    is_private: Optional[bool] = Form(False)
+    is_private: Optional[bool] = Form(False),
+    authorization: Optional[str] = Header(None)
 ):
     """
     Submit an ONNX model for Task 2 evaluation
     
+    - **Authorization**: `Bearer <JWT token from CPU server authentication>`
     - **file**: ONNX model file (.onnx)
-    - **team_token**: JWT token from CPU server authentication
+    - **team_token**: Same token as the header (optional, sent by older clients)
     - **batch_size**: Batch size for inference (default: 8)
     - **is_private**: Evaluate on private test set (default: False)
     """
     if not redis_client:
         raise HTTPException(status_code=503, detail="Redis not available")
     
+    # The rate limiter charged the header's team; the upload must be that team's
+    header_token = bearer_token(authorization)
+    if not header_token:
+        raise HTTPException(status_code=401, detail="Authorization: Bearer <team token> header required",
+                            headers={"WWW-Authenticate": "Bearer"})
+    if team_token is not None and team_token != header_token:
+        raise HTTPException(status_code=401, detail="team_token does not match the Authorization header")
+    team_token = header_token
+    
+    slot_reserved = False
+    model_ref = None  # Model this request holds a job reference on
     try:
-        # Verify token with CPU server and get team info
-        try:
-            headers = {'Authorization': f'Bearer {team_token}'}
-            cpu_response = requests.get(
-                f"{CPU_SERVER_URL}/api/auth/me",
-                headers=headers,
-                timeout=5
-            )
-            
-            if cpu_response.status_code != 200:
-                raise HTTPException(status_code=401, detail="Invalid authentication token")
-            
-            team_info = cpu_response.json()
-            team_id = team_info['id']
-            team_name = team_info['name']
-            
-        except requests.exceptions.RequestException as e:
-            raise HTTPException(status_code=503, detail=f"Cannot verify token with CPU server: {str(e)}")
-        
-        # Check submission limit with CPU server
-        try:
-            limit_response = requests.get(
-                f"{CPU_SERVER_URL}/api/submit/check-limit/task2/{team_id}",
-                headers={'X-GPU-Secret': GPU_SCORER_SECRET_KEY},
-                timeout=5
-            )
-            
-            if limit_response.status_code == 429:
-                raise HTTPException(status_code=429, detail="Submission limit reached for Task 2")
-            elif limit_response.status_code != 200:
-                raise HTTPException(status_code=500, detail="Failed to check submission limit")
-                
-        except requests.exceptions.RequestException as e:
-            raise HTTPException(status_code=503, detail=f"Cannot check limit with CPU server: {str(e)}")
+        # Verify token locally and take one slot from the team's cached quota
+        team_id, team_name = await authenticate_team(redis_client, team_token)
+        _check_admission()
+        await reserve_submission_slot(redis_client, team_id)
+        slot_reserved = True
         
         # Validate file type
         if not file.filename.endswith('.onnx'):
@@ -106,30 +204,40 @@ async def submit_task2_model(
         if batch_size < 1 or batch_size > 32:
             raise HTTPException(status_code=400, detail=f"Batch size must be between 1 and 32 (provided: {batch_size})")
         
-        # Check file size
-        content = await file.read()
-        file_size_mb = len(content) / (1024 * 1024)
+        # Save uploaded file (content-addressed, size checked while copying it out of the spooled upload)
+        model_path, model_hash, file_size = await _store_upload(file)
+        model_ref = model_path
+        file_size_mb = file_size / (1024 * 1024)
         
-        if file_size_mb > 100:
-            raise HTTPException(status_code=400, detail=f"Model file too large: {file_size_mb:.1f}MB (max 100MB)")
+        # Reject models that can't be evaluated before they take a GPU worker's time
+        if PREFLIGHT_ENABLED:
+            try:
+                await run_preflight(model_path)
+            except PreflightError as e:
+                raise HTTPException(status_code=422, detail=f"Model rejected by pre-flight check: {e}")
+        
+        # Publish it where workers on other nodes can fetch it
+        storage = artifact_storage.get_storage(UPLOAD_DIR)
+        if storage.remote:
+            await run_in_threadpool(storage.put, model_hash, model_path)
         
         # Generate unique submission ID
         submission_id = f"sub_{int(time.time())}_{uuid.uuid4().hex[:8]}"
         
-        # Save uploaded file
-        model_filename = f"{submission_id}.onnx"
-        model_path = UPLOAD_DIR / model_filename
-        
-        # Write file
-        with open(model_path, "wb") as f:
-            f.write(content)
+        # Predict evaluation time from the graph, for shortest-job-first scheduling
+        try:
+            cost = await run_in_threadpool(estimate_model_cost, str(model_path))
+        except Exception as e:
+            logger.warning(f"Cost estimation failed for {submission_id}: {e}")
+            cost = {'params': None, 'flops': None}
+        predicted_duration = cost_model.predict_duration(redis_client, team_id, cost['flops'])
         
-        # Set test data path and task based on is_private flag
+        # Set test set and task based on is_private flag
         if is_private:
-            test_data_path = "/app/data/test_data/private_test"
+            dataset = data_loader.PRIVATE_DATASET
             task_type = "task2_private"
         else:
-            test_data_path = TEST_DATA_PATH
+            dataset = data_loader.PUBLIC_DATASET
             task_type = "task2"
         
         # Create job for queue
@@ -138,35 +246,32 @@ async def submit_task2_model(
             'team_id': team_id,
             'team_name': team_name,
             'model_path': str(model_path),
-            'test_data_path': test_data_path,
+            'dataset': dataset,
             'batch_size': batch_size,
             'task': task_type,
             'timestamp': time.time(),
             'model_size_mb': file_size_mb,
-            'original_filename': file.filename
+            'original_filename': file.filename,
+            'model_hash': model_hash,
+            'params': cost['params'],
+            'flops': cost['flops'],
+            'predicted_duration': predicted_duration
         }
         
-        # Push to Redis queue
-        redis_client.lpush('evaluation_queue', json.dumps(job_data))
-        queue_position = redis_client.llen('evaluation_queue')
+        # Push to Redis queue (the job keeps its model reference until it finishes)
+        queue_position = job_queue.enqueue(redis_client, job_data, cost=predicted_duration)
+        
+        slot_reserved = False
+        model_ref = None
         
         # Notify CPU server about pending submission
-        try:
-            notify_data = {
-                'submission_id': submission_id,
-                'team_id': team_id,
-                'task_id': 2,
-                'filename': file.filename,
-                'status': 'queued'
-            }
-            requests.post(
-                f"{CPU_SERVER_URL}/api/gpu-callback/submission-queued",
-                json=notify_data,
-                headers={'X-GPU-Secret': GPU_SCORER_SECRET_KEY},
-                timeout=5
-            )
-        except:
-            pass  # Non-critical, continue even if notification fails
+        notify_data = {
+            'submission_id': submission_id,
+            'team_id': team_id,
+            'task_id': 2,
+            'filename': file.filename,
+            'status': 'queued'
+        }
         
         return JSONResponse(
             status_code=202,
@@ -175,64 +280,192 @@ async def submit_task2_model(
                 "submission_id": submission_id,
                 "status": "queued",
                 "queue_position": queue_position,
+                "estimated_wait_seconds": round(job_queue.estimated_wait(redis_client, submission_id)),
+                "predicted_duration_seconds": round(predicted_duration),
                 "model_size_mb": round(file_size_mb, 2),
                 "batch_size": batch_size,
                 "is_private": is_private,
                 "test_set": "private_test" if is_private else "public_test",
                 "team_name": team_name
-            }
+            },
+            background=BackgroundTask(notify_submission_queued, notify_data)
         )
         
     except HTTPException:
+        if slot_reserved:
+            release_submission_slot(redis_client, team_id)
+        # Not queued - the model is deleted unless something else uses it
+        model_store.release_job_ref(redis_client, model_ref)
         raise
     except Exception as e:
+        if slot_reserved:
+            release_submission_slot(redis_client, team_id)
+        model_store.release_job_ref(redis_client, model_ref)
         raise HTTPException(status_code=500, detail=f"Submission failed: {str(e)}")
 
 
+def _read_result(submission_id):
+    """Final result hash for a submission with JSON/number fields decoded, None if not finished"""
+    result = redis_client.hgetall(results_store.result_key(submission_id))
+    if not result:
+        return None
+    
+    # Parse JSON fields
+    if 'details' in result:
+        try:
+            result['details'] = json.loads(result['details'])
+        except:
+            pass
+    
+    # Convert score to float
+    if 'score' in result:
+        try:
+            result['score'] = float(result['score'])
+        except:
+            pass
+    
+    return result
+
+
+def _pending_status(submission_id, job):
+    """Status payload for a job that has no result yet"""
+    state = job.get('state', job_state.QUEUED)
+    content = {
+        "submission_id": submission_id,
+        "status": "queued" if state == job_state.QUEUED else "processing",
+        "state": state,
+        "queue_length": job_queue.queue_length(redis_client),
+        "timestamps": {k[:-3]: v for k, v in job.items() if k.endswith('_at') and k != 'updated_at'}
+    }
+    if state == job_state.QUEUED:
+        content["queue_position"] = job_queue.queue_position(redis_client, submission_id)
+        content["estimated_wait_seconds"] = round(job_queue.estimated_wait(redis_client, submission_id))
+        content["message"] = "Model is queued"
+    else:
+        content["worker_id"] = job.get('worker_id')
+        if job.get('cost') and job.get('loading_at'):
+            elapsed = time.time() - job['loading_at']
+            content["estimated_remaining_seconds"] = round(max(0.0, float(job['cost']) - elapsed))
+        content["message"] = "Model is being evaluated"
+    if state == job_state.PASS:
+        content["progress"] = {"pass": job.get('pass'), "passes": job.get('passes')}
+    return content
+
+
+def _current_status(submission_id):
+    """(http_status, payload) for a submission: 200 + result when finished, 202 + progress while pending"""
+    result = _read_result(submission_id)
+    if result is not None:
+        return 200, result
+    
+    job = job_state.get_state(redis_client, submission_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    return 202, _pending_status(submission_id, job)
+
+
+async def _job_events(submission_id, timeout):
+    """
+    Async iterator yielding (http_status, payload) each time the job changes state,
+    starting with its current status; stops when it finishes or after `timeout` seconds.
+    Subscribes before reading the status so no transition can be missed in between.
+    """
+    pubsub = async_redis_client.pubsub()
+    await pubsub.subscribe(job_state.events_channel(submission_id))
+    try:
+        code, payload = _current_status(submission_id)
+        yield code, payload
+        
+        deadline = time.monotonic() + timeout
+        while code == 202:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=min(remaining, SSE_KEEPALIVE_INTERVAL))
+            if message is None:
+                yield None, None  # Idle tick, lets SSE send a keep-alive
+                continue
+            code, payload = _current_status(submission_id)
+            yield code, payload
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.close()
+
+
 @router.get("/task2/status/{submission_id}")
-async def get_submission_status(submission_id: str):
-    """Get the status of a submission"""
+async def get_submission_status(
+    submission_id: str,
+    wait: int = Query(0, ge=0, description=f"Long-poll: seconds to wait for a state change (at most {LONG_POLL_MAX_WAIT})")
+):
+    """
+    Get the status of a submission
+    
+    Finished jobs return their result (200). Pending jobs return 202 with their
+    state (queued, loading, warmup, pass k/5, scoring), per-state timestamps and,
+    while queued, their position in the queue.
+    
+    With `wait`, a pending job's response is held until its state changes
+    (or `wait` seconds pass), so clients don't have to poll in a tight loop.
+    Longer waits are cut to LONG_POLL_MAX_WAIT rather than rejected.
+    """
     if not redis_client:
         raise HTTPException(status_code=503, detail="Redis not available")
     
+    wait = min(wait, LONG_POLL_MAX_WAIT)
     try:
-        # Check if result exists
-        if redis_client.exists(f'result:{submission_id}'):
-            result = redis_client.hgetall(f'result:{submission_id}')
-            
-            # Parse JSON fields
-            if 'details' in result:
-                try:
-                    result['details'] = json.loads(result['details'])
-                except:
-                    pass
-            
-            # Convert score to float
-            if 'score' in result:
-                try:
-                    result['score'] = float(result['score'])
-                except:
-                    pass
-            
-            return JSONResponse(content=result)
-        else:
-            # Check if still in queue
-            queue_length = redis_client.llen('evaluation_queue')
-            
-            return JSONResponse(
-                status_code=202,
-                content={
-                    "submission_id": submission_id,
-                    "status": "processing",
-                    "message": "Model is being evaluated or queued",
-                    "queue_length": queue_length
-                }
-            )
+        if not wait:
+            code, payload = _current_status(submission_id)
+            return JSONResponse(status_code=code, content=payload)
+        
+        # Answer with the first status after the current one (or the current one on timeout)
+        response = None
+        async with aclosing(_job_events(submission_id, wait)) as events:
+            async for code, payload in events:
+                if code is None:
+                    continue
+                if response is not None or code == 200:
+                    response = code, payload
+                    break
+                response = code, payload
+        code, payload = response
+        return JSONResponse(status_code=code, content=payload)
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Status check failed: {str(e)}")
 
 
+@router.get("/task2/events/{submission_id}")
+async def stream_submission_events(submission_id: str):
+    """
+    Server-Sent Events stream of a submission's progress
+    
+    Emits a `status` event with the same payload as the status endpoint on every
+    state change, then a final `result` event when the evaluation finishes.
+    """
+    if not redis_client:
+        raise HTTPException(status_code=503, detail="Redis not available")
+    
+    # Fail fast with a proper status code for unknown submissions
+    _current_status(submission_id)
+    
+    async def event_stream():
+        async with aclosing(_job_events(submission_id, SSE_MAX_DURATION)) as events:
+            async for code, payload in events:
+                if code is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                event = "result" if code == 200 else "status"
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/queue/status")
 async def get_queue_status():
     """Get current queue status"""
@@ -240,26 +473,29 @@ async def get_queue_status():
         raise HTTPException(status_code=503, detail="Redis not available")
     
     try:
-        queue_length = redis_client.llen('evaluation_queue')
-        
-        # Get recent results
-        result_keys = redis_client.keys('result:*')
-        recent_results = []
+        queue_length = job_queue.queue_length(redis_client)
         
-        for key in sorted(result_keys, reverse=True)[:10]:
-            result = redis_client.hgetall(key)
-            if result:
-                recent_results.append({
-                    'submission_id': result.get('submission_id', ''),
-                    'status': result.get('status', ''),
-                    'score': result.get('score', ''),
-                    'worker_id': result.get('worker_id', ''),
-                    'timestamp': result.get('timestamp', '')
-                })
+        # Get recent results, newest first
+        recent_results = [
+            {
+                'submission_id': result.get('submission_id', ''),
+                'status': result.get('status', ''),
+                'score': result.get('score', ''),
+                'worker_id': result.get('worker_id', ''),
+                'timestamp': result.get('timestamp', '')
+            }
+            for result in results_store.recent_results(redis_client, limit=10)
+        ]
         
         return JSONResponse(content={
             "queue_length": queue_length,
+            "backlog_seconds": round(job_queue.backlog_seconds(redis_client)),
+            "estimated_wait_seconds": round(job_queue.estimated_wait(redis_client)),
+            "in_progress": job_queue.pending_count(redis_client),
+            "dead_lettered": redis_client.xlen(job_queue.DEAD_LETTER_KEY),
             "total_workers": int(os.getenv("WORKER_COUNT", 1)),
+            "model_store": model_store.stats(redis_client),
+            "dataset_cache": data_loader.worker_cache_stats(redis_client),
             "recent_results_count": len(recent_results),
             "recent_results": recent_results
         })
@@ -278,13 +514,9 @@ async def delete_submission(submission_id: str):
         raise HTTPException(status_code=503, detail="Redis not available")
     
     try:
-        # Delete result from Redis
-        deleted = redis_client.delete(f'result:{submission_id}')
-        
-        # Delete model file if exists
-        model_path = UPLOAD_DIR / f"{submission_id}.onnx"
-        if model_path.exists():
-            model_path.unlink()
+        # Delete result from Redis (model files are content-addressed and may be
+        # shared with other submissions, so they are left in place)
+        deleted = results_store.delete_result(redis_client, submission_id)
         
         if deleted:
             return JSONResponse(content={
@@ -316,10 +548,10 @@ async def calculate_private_leaderboard(x_gpu_secret: str = Header(None)):
         raise HTTPException(status_code=401, detail="Invalid or missing GPU secret key")
     
     try:
-        # Get all team best model keys from Redis
-        team_keys = redis_client.keys('team:*:best_model')
+        # Get every team's best model in one read
+        team_bests = results_store.all_team_bests(redis_client)
         
-        if not team_keys:
+        if not team_bests:
             return JSONResponse(content={
                 "message": "No teams found with best models",
                 "teams_processed": 0
@@ -327,21 +559,15 @@ async def calculate_private_leaderboard(x_gpu_secret: str = Header(None)):
         
         teams_to_evaluate = []
         
-        for team_key in team_keys:
-            # Extract team_id from key: "team:123:best_model" -> "123"
-            team_id = team_key.split(':')[1]
-            
-            # Get team's best model info
-            best_model_path = redis_client.get(f'team:{team_id}:best_model')
-            best_submission_id = redis_client.get(f'team:{team_id}:best_submission')
-            best_score = redis_client.get(f'team:{team_id}:best_score')
+        for team_id, best in team_bests.items():
+            best_model_path = best.get('model_path')
             
             if best_model_path and os.path.exists(best_model_path):
                 teams_to_evaluate.append({
                     'team_id': team_id,
                     'model_path': best_model_path,
-                    'submission_id': best_submission_id,
-                    'public_score': float(best_score) if best_score else 0
+                    'submission_id': best.get('submission_id'),
+                    'public_score': float(best.get('score') or 0)
                 })
         
         if not teams_to_evaluate:
@@ -351,7 +577,6 @@ async def calculate_private_leaderboard(x_gpu_secret: str = Header(None)):
             })
         
         # Queue each team's best model for evaluation on private test set
-        private_test_path = "/app/data/test_data/private_test"
         queued_evaluations = []
         
         for team_data in teams_to_evaluate:
@@ -362,7 +587,8 @@ async def calculate_private_leaderboard(x_gpu_secret: str = Header(None)):
                 'submission_id': private_submission_id,
                 'team_id': team_data['team_id'],
                 'model_path': team_data['model_path'],
-                'test_data_path': private_test_path,
+                'model_hash': artifact_storage.model_hash_of(team_data['model_path']),
+                'dataset': data_loader.PRIVATE_DATASET,
                 'batch_size': 8,
                 'task': 'task2_private',
                 'timestamp': time.time(),
@@ -370,8 +596,14 @@ async def calculate_private_leaderboard(x_gpu_secret: str = Header(None)):
                 'public_score': team_data['public_score']
             }
             
-            # Push to Redis queue
-            redis_client.lpush('evaluation_queue', json.dumps(job_data))
+            # Private re-evaluations are scheduled ahead of live submissions
+            if not model_store.add_job_ref(redis_client, team_data['model_path']):
+                logger.warning(f"Best model of team {team_data['team_id']} is being deleted, not re-evaluating it")
+                continue
+            job_queue.enqueue(
+                redis_client, job_data, priority=True,
+                cost=cost_model.predict_duration(redis_client, team_data['team_id'])
+            )
             
             queued_evaluations.append({
                 'team_id': team_data['team_id'],
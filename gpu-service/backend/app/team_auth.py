@@ -0,0 +1,177 @@
+"""Local team token verification with a Redis cache of team identity and Task 2 quota"""
+
+import asyncio
+import os
+import logging
+import httpx
+from fastapi import HTTPException
+from jose import JWTError, jwt
+
+from app.http_client import http_client
+
+logger = logging.getLogger(__name__)
+
+CPU_SERVER_URL = os.getenv('CPU_SERVER_URL', 'http://cpu-server:8000')
+GPU_SCORER_SECRET_KEY = os.getenv('GPU_SCORER_SECRET_KEY')
+# Same signing key as the CPU server, so team tokens can be verified without a round trip
+HACKATHON_SECRET_KEY = os.getenv('HACKATHON_SECRET_KEY')
+JWT_ALGORITHM = "HS256"
+
+TEAM_INFO_TTL = int(os.getenv('TEAM_INFO_TTL', 24 * 3600))  # seconds
+QUOTA_TTL = int(os.getenv('QUOTA_TTL', 3600))  # seconds
+QUOTA_RECONCILE_INTERVAL = int(os.getenv('QUOTA_RECONCILE_INTERVAL', 60))  # seconds
+
+KNOWN_TEAMS_KEY = 'teams:known'
+
+# Take one submission from a team's cached quota. A missing key is filled from
+# ARGV[1] (with its TTL) if given, otherwise false is returned so the caller can
+# fetch the count. Returns the quota left, -1 when it is exhausted. Decrementing
+# only an existing key keeps a concurrent expiry from leaving a key without TTL.
+_RESERVE_SCRIPT = """
+local remaining = redis.call('GET', KEYS[1])
+if not remaining then
+    if ARGV[1] == '' then
+        return false
+    end
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    remaining = ARGV[1]
+end
+if tonumber(remaining) <= 0 then
+    return -1
+end
+return redis.call('DECR', KEYS[1])
+"""
+
+# Give a slot back, but only to a quota that is still cached
+_RELEASE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCR', KEYS[1])
+end
+return false
+"""
+
+
+def _team_info_key(team_id):
+    return f'team:{team_id}:info'
+
+
+def _quota_key(team_id):
+    return f'team:{team_id}:quota_remaining'
+
+
+async def _fetch_team_from_cpu(team_token):
+    """Resolve a token through the CPU server (fallback when it can't be verified locally)"""
+    try:
+        response = await http_client.get(
+            f"{CPU_SERVER_URL}/api/auth/me",
+            headers={'Authorization': f'Bearer {team_token}'}
+        )
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=503, detail=f"Cannot verify token with CPU server: {str(e)}")
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=401, detail="Invalid authentication token")
+    return response.json()
+
+
+async def _fetch_remaining_quota(team_id):
+    """Ask the CPU server how many Task 2 submissions a team has left"""
+    try:
+        response = await http_client.get(
+            f"{CPU_SERVER_URL}/api/submit/check-limit/task2/{team_id}",
+            headers={'X-GPU-Secret': GPU_SCORER_SECRET_KEY}
+        )
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=503, detail=f"Cannot check limit with CPU server: {str(e)}")
+
+    if response.status_code == 429:
+        return 0
+    if response.status_code != 200:
+        raise HTTPException(status_code=500, detail="Failed to check submission limit")
+    return int(response.json()['remaining'])
+
+
+def bearer_token(authorization):
+    """Token of an `Authorization: Bearer <token>` header value, None if there is none"""
+    if not authorization or not authorization.lower().startswith('bearer '):
+        return None
+    return authorization[len('bearer '):].strip() or None
+
+
+def decode_team_token(team_token):
+    """Verify a team JWT locally; returns its claims or raises 401"""
+    try:
+        claims = jwt.decode(team_token, HACKATHON_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid authentication token")
+    if claims.get('sub') is None:
+        raise HTTPException(status_code=401, detail="Invalid authentication token")
+    return claims
+
+
+async def authenticate_team(redis_client, team_token):
+    """
+    Return (team_id, team_name) for a team token.
+
+    The signature is checked locally with the shared signing key; the team name comes
+    from the token, the Redis cache, or - once per team - the CPU server. Without a
+    shared key configured, every call falls back to the CPU server.
+    """
+    if not HACKATHON_SECRET_KEY:
+        team_info = await _fetch_team_from_cpu(team_token)
+        return team_info['id'], team_info['name']
+
+    claims = decode_team_token(team_token)
+    team_id = int(claims['sub'])
+
+    team_name = claims.get('name') or redis_client.hget(_team_info_key(team_id), 'name')
+    if not team_name:
+        team_info = await _fetch_team_from_cpu(team_token)
+        team_name = team_info['name']
+
+    pipe = redis_client.pipeline()
+    pipe.hset(_team_info_key(team_id), mapping={'name': team_name})
+    pipe.expire(_team_info_key(team_id), TEAM_INFO_TTL)
+    pipe.sadd(KNOWN_TEAMS_KEY, team_id)
+    pipe.execute()
+
+    return team_id, team_name
+
+
+async def reserve_submission_slot(redis_client, team_id):
+    """
+    Take one Task 2 submission from the team's cached quota, or raise 429.
+    A cold cache is filled from the CPU server once; afterwards it is only
+    reconciled in the background.
+    """
+    reserve_script = redis_client.register_script(_RESERVE_SCRIPT)
+    keys = [_quota_key(team_id)]
+    remaining = reserve_script(keys=keys, args=['', QUOTA_TTL])
+    if remaining is None:
+        fetched = await _fetch_remaining_quota(team_id)
+        remaining = reserve_script(keys=keys, args=[fetched, QUOTA_TTL])
+
+    if remaining < 0:
+        raise HTTPException(status_code=429, detail="Submission limit reached for Task 2")
+
+
+def release_submission_slot(redis_client, team_id):
+    """Give back a reserved slot when the submission is rejected after reservation"""
+    release_script = redis_client.register_script(_RELEASE_SCRIPT)
+    release_script(keys=[_quota_key(team_id)])
+
+
+async def reconcile_quotas(redis_client):
+    """Background task: periodically overwrite cached quotas with the CPU server's counts"""
+    while True:
+        await asyncio.sleep(QUOTA_RECONCILE_INTERVAL)
+        try:
+            for team_id in redis_client.smembers(KNOWN_TEAMS_KEY):
+                try:
+                    remaining = await _fetch_remaining_quota(team_id)
+                except HTTPException as e:
+                    logger.warning(f"Quota reconcile failed for team {team_id}: {e.detail}")
+                    continue
+                redis_client.set(_quota_key(team_id), remaining, ex=QUOTA_TTL)
+        except Exception as e:
+            logger.error(f"Quota reconcile error: {e}")
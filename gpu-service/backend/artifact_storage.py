@@ -0,0 +1,187 @@
+"""Content-addressed storage of model artifacts: local filesystem or S3-compatible object store"""
+
+import os
+import uuid
+import shutil
+import threading
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# 'local' (shared volume, single host) or 's3' (any S3-compatible store, e.g. MinIO)
+ARTIFACT_STORAGE = os.getenv('ARTIFACT_STORAGE', 'local')
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')  # e.g. http://minio:9000, unset for AWS
+S3_BUCKET = os.getenv('S3_BUCKET', 'mls-goat-models')
+S3_PREFIX = os.getenv('S3_PREFIX', 'models/')
+S3_ACCESS_KEY = os.getenv('S3_ACCESS_KEY')
+S3_SECRET_KEY = os.getenv('S3_SECRET_KEY')
+S3_REGION = os.getenv('S3_REGION', 'us-east-1')
+
+# Worker-local copies of remote models, least recently used evicted first
+MODEL_CACHE_DIR = os.getenv('MODEL_CACHE_DIR', '/tmp/model_cache')
+MODEL_CACHE_MB = float(os.getenv('MODEL_CACHE_MB', 5 * 1024))
+
+
+def model_hash_of(model_path):
+    """Content hash of a stored model from its <sha256>.onnx file name"""
+    return Path(model_path).stem
+
+
+class LocalStorage:
+    """Models live in one directory every worker can read (a shared Docker volume)"""
+
+    remote = False
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def path(self, model_hash):
+        return self.root / f"{model_hash}.onnx"
+
+    def put(self, model_hash, local_path):
+        if Path(local_path) != self.path(model_hash):
+            shutil.copyfile(local_path, self.path(model_hash))
+
+    def exists(self, model_hash):
+        return self.path(model_hash).exists()
+
+    def fetch(self, model_hash, dest_path):
+        shutil.copyfile(self.path(model_hash), dest_path)
+
+    def delete(self, model_hash):
+        try:
+            self.path(model_hash).unlink()
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage:
+    """Models are objects <prefix><sha256>.onnx in an S3-compatible bucket"""
+
+    remote = True
+
+    def __init__(self, bucket=S3_BUCKET, prefix=S3_PREFIX, endpoint_url=S3_ENDPOINT_URL):
+        import boto3
+        from botocore.exceptions import ClientError
+
+        self._client_error = ClientError
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            aws_access_key_id=S3_ACCESS_KEY,
+            aws_secret_access_key=S3_SECRET_KEY,
+            region_name=S3_REGION
+        )
+
+    def _key(self, model_hash):
+        return f"{self.prefix}{model_hash}.onnx"
+
+    def ensure_bucket(self):
+        try:
+            self.client.head_bucket(Bucket=self.bucket)
+        except self._client_error:
+            self.client.create_bucket(Bucket=self.bucket)
+
+    def put(self, model_hash, local_path):
+        if not self.exists(model_hash):
+            self.client.upload_file(str(local_path), self.bucket, self._key(model_hash))
+
+    def exists(self, model_hash):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(model_hash))
+            return True
+        except self._client_error:
+            return False
+
+    def fetch(self, model_hash, dest_path):
+        self.client.download_file(self.bucket, self._key(model_hash), str(dest_path))
+
+    def delete(self, model_hash):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(model_hash))
+
+
+class ModelCache:
+    """
+    Local copies of models fetched from remote storage, kept within a byte
+    budget. Files are named by content hash, so a cached copy never goes stale.
+    """
+
+    def __init__(self, storage, cache_dir=MODEL_CACHE_DIR, budget_mb=MODEL_CACHE_MB):
+        self.storage = storage
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.budget = budget_mb * 1024 * 1024
+        self._lock = threading.Lock()
+
+    def fetch(self, model_hash):
+        """Local path of a model, downloading it on a miss"""
+        path = self.cache_dir / f"{model_hash}.onnx"
+        with self._lock:
+            if path.exists():
+                os.utime(path)  # Most recently used
+                return str(path)
+
+            tmp_path = self.cache_dir / f".{model_hash}.{uuid.uuid4().hex}"
+            try:
+                self.storage.fetch(model_hash, tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+            logger.info(f"Fetched model {model_hash} into local cache")
+
+            self._evict(keep=path)
+            return str(path)
+
+    def _evict(self, keep):
+        entries = sorted(
+            (entry for entry in os.scandir(self.cache_dir) if entry.is_file() and entry.name.endswith('.onnx')),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        used = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if used <= self.budget:
+                break
+            if entry.path == str(keep):
+                continue
+            used -= entry.stat().st_size
+            os.remove(entry.path)
+            logger.info(f"Evicted {entry.name} from local model cache")
+
+
+_storage = None
+_model_cache = None
+
+
+def get_storage(local_root='/app/data/uploads'):
+    """The configured artifact storage backend (created once per process)"""
+    global _storage
+    if _storage is None:
+        if ARTIFACT_STORAGE == 's3':
+            _storage = S3Storage()
+            _storage.ensure_bucket()
+        elif ARTIFACT_STORAGE == 'local':
+            _storage = LocalStorage(local_root)
+        else:
+            raise ValueError(f"Unknown ARTIFACT_STORAGE: {ARTIFACT_STORAGE}")
+    return _storage
+
+
+def get_model_cache():
+    """This worker's local cache of remote models"""
+    global _model_cache
+    if _model_cache is None:
+        _model_cache = ModelCache(get_storage())
+    return _model_cache
+
+
+def resolve_model_path(job_data):
+    """Local file to evaluate for a job: the shared path, or a cached copy fetched from remote storage"""
+    storage = get_storage()
+    if not storage.remote:
+        return job_data['model_path']
+    model_hash = job_data.get('model_hash') or model_hash_of(job_data['model_path'])
+    return get_model_cache().fetch(model_hash)
@@ -0,0 +1,266 @@
+"""Durable delivery of evaluation results to the CPU server through a Redis outbox"""
+
+import os
+import json
+import math
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+import logging
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_BATCH_WINDOW = float(os.getenv('CALLBACK_BATCH_WINDOW', 0.5))  # seconds
+CALLBACK_BATCH_SIZE = int(os.getenv('CALLBACK_BATCH_SIZE', 50))
+CALLBACK_MAX_BACKOFF = float(os.getenv('CALLBACK_MAX_BACKOFF', 60))  # seconds
+# A batch that keeps failing is split, so one bad result can't hold back the others
+CALLBACK_SPLIT_AFTER = int(os.getenv('CALLBACK_SPLIT_AFTER', 3))
+# A single result the CPU server keeps answering with a server error is dead-lettered
+CALLBACK_MAX_ATTEMPTS = int(os.getenv('CALLBACK_MAX_ATTEMPTS', 8))
+# A sender silent for this long is presumed dead; its in-flight results go back to the outbox
+CALLBACK_SENDER_TIMEOUT = int(os.getenv('CALLBACK_SENDER_TIMEOUT', 600))  # seconds
+# How often a sender looks for dead senders' in-flight results
+CALLBACK_RECOVER_INTERVAL = int(os.getenv('CALLBACK_RECOVER_INTERVAL', 300))  # seconds
+
+OUTBOX_KEY = 'callback_outbox'
+DEAD_LETTER_KEY = 'callback_outbox:dead'
+PROCESSING_PREFIX = f'{OUTBOX_KEY}:processing:'
+# sender_id -> last time it was active
+SENDERS_KEY = 'callback_outbox:senders'
+
+# Hand a dead sender's processing list back to the outbox, oldest entry at the
+# consuming end. Skipped if the sender has been active since it was found stale.
+_RECOVER_SCRIPT = """
+local seen = redis.call('ZSCORE', KEYS[3], ARGV[1])
+if seen and tonumber(seen) > tonumber(ARGV[2]) then
+    return 0
+end
+local moved = 0
+while redis.call('LMOVE', KEYS[1], KEYS[2], 'RIGHT', 'RIGHT') do
+    moved = moved + 1
+end
+redis.call('ZREM', KEYS[3], ARGV[1])
+return moved
+"""
+
+
+def build_callback_payload(result):
+    """Shape a worker result into the payload expected by /api/gpu-callback/result(s)"""
+    return {
+        'submission_id': result['submission_id'],
+        'original_submission_id': result.get('original_submission_id'),
+        'filename': result.get('filename'),
+        'team_id': result.get('team_id'),
+        'task_id': 2,
+        'status': result['status'],
+        'score': result.get('score', 0),
+        'error': result.get('error'),
+        'is_private': result.get('is_private', False),
+        'details': result.get('details', {}),
+        'timestamp': result['timestamp']
+    }
+
+
+def json_safe(value):
+    """Copy of a payload JSON can encode: numpy values as Python ones, NaN / Inf as null"""
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    if hasattr(value, 'tolist'):
+        return json_safe(value.tolist())
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class CallbackSender:
+    """
+    Delivers results to the CPU server from a background thread.
+
+    `send()` only appends the result to a Redis outbox list, so the worker can pick
+    up its next job right after scoring and results survive worker restarts and CPU
+    server outages. The sender thread moves entries into its own processing list
+    (`sender_id` must be unique to the process), coalesces whatever arrives within
+    `batch_window` seconds into one POST to the batch endpoint, and retries with
+    exponential backoff until the CPU server accepts it. The CPU server upserts by
+    submission id, so re-delivery after a lost response is harmless. A batch that
+    keeps failing is split until the result at fault is isolated; that one is
+    dead-lettered and the rest are delivered, as are results the CPU server reports
+    as invalid.
+
+    Senders heartbeat while they work. A crash mid-delivery leaves entries in the
+    dead sender's processing list; a live sender hands them back to the outbox
+    at startup and every CALLBACK_RECOVER_INTERVAL once the heartbeat is older
+    than CALLBACK_SENDER_TIMEOUT.
+    """
+
+    def __init__(self, redis_client, cpu_server_url, secret_key, sender_id,
+                 batch_window=CALLBACK_BATCH_WINDOW, batch_size=CALLBACK_BATCH_SIZE):
+        self.redis_client = redis_client
+        self.cpu_server_url = cpu_server_url
+        self.secret_key = secret_key
+        self.sender_id = sender_id
+        self.processing_key = f'{PROCESSING_PREFIX}{sender_id}'
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+
+        # Pooled keep-alive session, reused for every delivery
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.headers.update({'X-GPU-Secret': secret_key})
+
+        self._thread = threading.Thread(target=self._run, name="callback-sender", daemon=True)
+        self._thread.start()
+
+    def send(self, result):
+        """Append a result to the outbox, returns immediately"""
+        payload = build_callback_payload(result)
+        try:
+            entry = json.dumps(json_safe(payload), allow_nan=False)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Result for {payload['submission_id']} can't be serialized, dead-lettering it: {e}")
+            self.redis_client.lpush(DEAD_LETTER_KEY, json.dumps({
+                'submission_id': payload['submission_id'], 'error': str(e), 'payload': repr(payload)
+            }))
+            return
+        self.redis_client.lpush(OUTBOX_KEY, entry)
+
+    def _heartbeat(self):
+        self.redis_client.zadd(SENDERS_KEY, {self.sender_id: time.time()})
+
+    def recover_dead_senders(self):
+        """Return results stuck in the processing lists of dead senders to the outbox"""
+        stale_before = time.time() - CALLBACK_SENDER_TIMEOUT
+        recover_script = self.redis_client.register_script(_RECOVER_SCRIPT)
+        for key in self.redis_client.scan_iter(match=f'{PROCESSING_PREFIX}*'):
+            sender_id = key[len(PROCESSING_PREFIX):]
+            if sender_id == self.sender_id:
+                continue
+            # Lists of senders that never heartbeated (older releases) count as stale
+            seen = self.redis_client.zscore(SENDERS_KEY, sender_id)
+            if seen is not None and seen > stale_before:
+                continue
+            moved = recover_script(keys=[key, OUTBOX_KEY, SENDERS_KEY], args=[sender_id, stale_before])
+            if moved:
+                logger.warning(f"Recovered {moved} undelivered result(s) from dead sender {sender_id}")
+        self.redis_client.zremrangebyscore(SENDERS_KEY, '-inf', stale_before)
+
+    def _next_batch(self):
+        """Move up to batch_size entries from the outbox into the processing list"""
+        first = self.redis_client.blmove(OUTBOX_KEY, self.processing_key, 5, 'RIGHT', 'RIGHT')
+        if first is None:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size and time.monotonic() < deadline:
+            entry = self.redis_client.lmove(OUTBOX_KEY, self.processing_key, 'RIGHT', 'RIGHT')
+            if entry is None:
+                time.sleep(min(0.05, max(0.0, deadline - time.monotonic())))
+                continue
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        next_recovery = 0
+        while True:
+            try:
+                self._heartbeat()
+                if time.monotonic() >= next_recovery:
+                    self.recover_dead_senders()
+                    next_recovery = time.monotonic() + CALLBACK_RECOVER_INTERVAL
+                batch = self._next_batch()
+                if not batch:
+                    continue
+                self._deliver(batch)
+            except Exception as e:
+                logger.error(f"Callback sender error: {e}", exc_info=True)
+                time.sleep(5)
+
+    def _done(self, entries):
+        """Drop delivered (or dead-lettered) entries from the processing list"""
+        pipe = self.redis_client.pipeline()
+        for entry in entries:
+            pipe.lrem(self.processing_key, 1, entry)
+        pipe.execute()
+
+    def _dead_letter(self, entries, reason):
+        logger.error(f"Dead-lettering {len(entries)} result(s): {reason}")
+        self.redis_client.lpush(DEAD_LETTER_KEY, *entries)
+        self._done(entries)
+
+    def _deliver(self, entries):
+        """Deliver outbox entries, retrying with backoff; a batch that keeps failing is split"""
+        attempt = 0
+        while True:
+            self._heartbeat()
+            outcome, invalid = self._post_batch(entries)
+            if outcome == 'delivered':
+                if invalid:
+                    self._dead_letter(invalid, "reported invalid by the CPU server")
+                self._done([entry for entry in entries if entry not in invalid])
+                return
+
+            attempt += 1
+            if len(entries) > 1 and (outcome == 'rejected' or attempt >= CALLBACK_SPLIT_AFTER):
+                # Find out which result is at fault and deliver the others
+                half = len(entries) // 2
+                self._deliver(entries[:half])
+                self._deliver(entries[half:])
+                return
+            if len(entries) == 1 and (outcome == 'rejected' or (outcome == 'server_error' and attempt >= CALLBACK_MAX_ATTEMPTS)):
+                self._dead_letter(entries, f"{outcome} after {attempt} attempt(s)")
+                return
+
+            delay = min(CALLBACK_MAX_BACKOFF, 2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.warning(f"Retrying delivery of {len(entries)} result(s) in {delay:.1f}s (attempt {attempt})")
+            time.sleep(delay)
+
+    def _post_batch(self, entries):
+        """
+        POST a batch of outbox entries. Returns (outcome, entries the CPU server
+        found invalid); outcome is 'delivered', 'retry' (CPU server unreachable or
+        unavailable), 'server_error' (it failed processing the batch) or 'rejected'
+        (it will never accept the batch as is)
+        """
+        try:
+            body = json.dumps({'results': [json_safe(json.loads(entry)) for entry in entries]}, allow_nan=False)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Can't serialize {len(entries)} result(s): {e}")
+            return 'rejected', []
+
+        try:
+            response = self.session.post(
+                f"{self.cpu_server_url}/api/gpu-callback/results",
+                data=body,
+                headers={'Content-Type': 'application/json'},
+                timeout=10
+            )
+        except requests.RequestException as e:
+            logger.error(f"Error sending results to CPU server: {e}")
+            return 'retry', []
+
+        if response.status_code == 200:
+            logger.info(f"Results sent to CPU server for {len(entries)} submission(s)")
+            try:
+                statuses = response.json().get('results', [])
+            except ValueError:
+                statuses = []
+            # Per-result statuses come back in the order the results were sent
+            return 'delivered', [
+                entry for entry, status in zip(entries, statuses)
+                if isinstance(status, dict) and status.get('status') == 'invalid'
+            ]
+
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            logger.error(f"CPU server rejected {len(entries)} result(s) ({response.status_code}): {response.text}")
+            return 'rejected', []
+
+        logger.warning(f"Failed to send {len(entries)} result(s) to CPU: {response.status_code}")
+        if response.status_code in (429, 502, 503, 504):
+            return 'retry', []
+        return 'server_error', []
@@ -0,0 +1,102 @@
+"""Predicted evaluation time of a job, learned from measured durations"""
+
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# seconds = EVAL_BASE_SECONDS + GFLOPs per sample * seconds_per_gflop, times the team's correction factor
+EVAL_BASE_SECONDS = float(os.getenv('EVAL_BASE_SECONDS', 20))  # seconds
+EVAL_SECONDS_PER_GFLOP = float(os.getenv('EVAL_SECONDS_PER_GFLOP', 0.3))  # seconds
+# Used when a model's FLOPs could not be estimated and its team has no history
+EVAL_DEFAULT_SECONDS = float(os.getenv('EVAL_DEFAULT_SECONDS', 60))  # seconds
+# Weight of the newest measurement in the moving averages
+COST_MODEL_ALPHA = float(os.getenv('COST_MODEL_ALPHA', 0.2))
+
+# A worker not seen for this long (it checks in between jobs) no longer counts towards queue throughput
+WORKER_ACTIVE_WINDOW = int(os.getenv('WORKER_ACTIVE_WINDOW', 900))  # seconds
+
+STATS_KEY = 'cost_model:stats'
+# team_id -> moving average of measured / predicted duration
+TEAM_RATIO_KEY = 'cost_model:team_ratio'
+# team_id -> moving average of measured duration
+TEAM_DURATION_KEY = 'cost_model:team_duration'
+# worker_id (unique per worker process) -> last time it asked for work
+WORKERS_SEEN_KEY = 'cost_model:workers_seen'
+# worker_id -> moving average of predicted / measured duration (1.0 = as fast as predicted)
+WORKER_SPEED_KEY = 'cost_model:worker_speed'
+
+
+def _ewma(previous, value):
+    return value if previous is None else (1 - COST_MODEL_ALPHA) * float(previous) + COST_MODEL_ALPHA * value
+
+
+def _static_prediction(redis_client, flops):
+    seconds_per_gflop = redis_client.hget(STATS_KEY, 'seconds_per_gflop')
+    seconds_per_gflop = float(seconds_per_gflop) if seconds_per_gflop else EVAL_SECONDS_PER_GFLOP
+    return EVAL_BASE_SECONDS + flops / 1e9 * seconds_per_gflop
+
+
+def predict_duration(redis_client, team_id, flops=None):
+    """Expected evaluation time in seconds of a team's model with `flops` per sample"""
+    pipe = redis_client.pipeline()
+    pipe.hget(TEAM_RATIO_KEY, team_id)
+    pipe.hget(TEAM_DURATION_KEY, team_id)
+    ratio, team_duration = pipe.execute()
+
+    if flops:
+        return _static_prediction(redis_client, flops) * (float(ratio) if ratio else 1.0)
+    return float(team_duration) if team_duration else EVAL_DEFAULT_SECONDS
+
+
+def record_duration(redis_client, team_id, flops, duration):
+    """Fold a measured evaluation time into the global rate and the team's history"""
+    try:
+        if flops:
+            if duration > EVAL_BASE_SECONDS:
+                rate = (duration - EVAL_BASE_SECONDS) / (flops / 1e9)
+                redis_client.hset(STATS_KEY, 'seconds_per_gflop', _ewma(redis_client.hget(STATS_KEY, 'seconds_per_gflop'), rate))
+            # The team factor only corrects what the updated global rate still gets wrong
+            predicted = _static_prediction(redis_client, flops)
+            if team_id:
+                redis_client.hset(TEAM_RATIO_KEY, team_id, _ewma(redis_client.hget(TEAM_RATIO_KEY, team_id), duration / predicted))
+        if team_id:
+            redis_client.hset(TEAM_DURATION_KEY, team_id, _ewma(redis_client.hget(TEAM_DURATION_KEY, team_id), duration))
+    except Exception as e:
+        # Cost learning must never fail an evaluation
+        logger.warning(f"Failed to record duration for team {team_id}: {e}")
+
+
+def worker_alive(redis_client, worker_id):
+    """Mark a worker as available; called from its loop"""
+    redis_client.zadd(WORKERS_SEEN_KEY, {worker_id: time.time()})
+
+
+def record_worker_speed(redis_client, worker_id, predicted, duration):
+    """Fold one job's predicted vs. measured time into the worker's rolling throughput"""
+    if not predicted or duration <= 0:
+        return
+    try:
+        previous = redis_client.hget(WORKER_SPEED_KEY, worker_id)
+        redis_client.hset(WORKER_SPEED_KEY, worker_id, _ewma(previous, float(predicted) / duration))
+    except Exception as e:
+        logger.warning(f"Failed to record throughput of worker {worker_id}: {e}")
+
+
+def capacity(redis_client):
+    """Predicted seconds of evaluation the active workers get through per second"""
+    now = time.time()
+    gone = redis_client.zrangebyscore(WORKERS_SEEN_KEY, '-inf', now - WORKER_ACTIVE_WINDOW)
+    if gone:
+        # Worker ids change with every restart - forget the old ones' speeds too
+        pipe = redis_client.pipeline()
+        pipe.zrem(WORKERS_SEEN_KEY, *gone)
+        pipe.hdel(WORKER_SPEED_KEY, *gone)
+        pipe.execute()
+    workers = redis_client.zrange(WORKERS_SEEN_KEY, 0, -1)
+    if not workers:
+        # Nobody has reported yet - assume a single worker running at predicted speed
+        return 1.0
+    speeds = redis_client.hmget(WORKER_SPEED_KEY, workers)
+    return sum(float(speed) if speed else 1.0 for speed in speeds)
@@ -1,27 +1,188 @@
 """Data loading and caching for test images and ground truth"""
 
+import os
+import json
+import time
 import numpy as np
+from collections import OrderedDict
 from pathlib import Path
-from PIL import Image
 import logging
 
+import dataset_compiler
+
 logger = logging.getLogger(__name__)
 
-# Global cache for test data (loaded once per worker)
-TEST_DATA_CACHE = {}
-GROUND_TRUTH_CACHE = {}
+# Test sets jobs may be evaluated on: dataset id -> directory. Jobs name an id, never a path
+DATASETS = dict(
+    entry.split('=', 1) for entry in os.getenv(
+        'DATASETS', 'public_test=/app/data/test_data/public_test,private_test=/app/data/test_data/private_test'
+    ).split(',') if entry
+)
+PUBLIC_DATASET = 'public_test'
+PRIVATE_DATASET = 'private_test'
+
+# Memory budget for the test sets a worker keeps loaded; least recently used ones are dropped above it
+DATASET_CACHE_MB = float(os.getenv('DATASET_CACHE_MB', 4 * 1024))
+# worker id (unique per worker process) -> JSON stats of its dataset cache
+DATASET_CACHE_STATS_KEY = 'workers:dataset_cache'
+# Stats not refreshed for this long are from a worker that is gone
+DATASET_CACHE_STATS_MAX_AGE = int(os.getenv('DATASET_CACHE_STATS_MAX_AGE', 900))  # seconds
+
+
+def dataset_path(dataset_id):
+    """Directory of an allowed test set"""
+    if dataset_id not in DATASETS:
+        raise ValueError(f"Unknown dataset '{dataset_id}' (allowed: {', '.join(sorted(DATASETS))})")
+    return DATASETS[dataset_id]
+
+
+def dataset_for_path(test_data_path):
+    """Dataset id of an allowed test set directory (for jobs queued with a test_data_path)"""
+    for dataset_id, path in DATASETS.items():
+        if Path(path) == Path(test_data_path):
+            return dataset_id
+    raise ValueError(f"Test set {test_data_path} is not an allowed dataset")
+
+
+class DatasetCache:
+    """
+    Loaded test sets within a byte budget, least recently used evicted first.
+    Each dataset caches its parts ('test_data', 'ground_truth') separately, so
+    timing-only evaluations never load ground truth. `on_evict(dataset_id)` lets
+    other holders of an evicted dataset drop it too, so its memory is released.
+    """
+    
+    def __init__(self, budget_mb=DATASET_CACHE_MB, on_evict=None):
+        self.budget = budget_mb * 1024 * 1024
+        self.on_evict = on_evict
+        self._entries = OrderedDict()  # dataset id -> {part: (value, nbytes)}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, dataset_id, part):
+        entry = self._entries.get(dataset_id)
+        if entry is None or part not in entry:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(dataset_id)
+        self.hits += 1
+        return entry[part][0]
+    
+    def put(self, dataset_id, part, value, nbytes):
+        self._entries.setdefault(dataset_id, {})[part] = (value, nbytes)
+        self._entries.move_to_end(dataset_id)
+        
+        while self.used_bytes() > self.budget and len(self._entries) > 1:
+            evicted_id, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict:
+                self.on_evict(evicted_id)
+            logger.info(f"Evicted dataset {evicted_id} from cache")
+        if self.used_bytes() > self.budget:
+            logger.warning(f"Dataset {dataset_id} alone exceeds the {self.budget / 1024**2:.0f}MB dataset cache budget")
+    
+    def used_bytes(self):
+        return sum(nbytes for entry in self._entries.values() for _, nbytes in entry.values())
+    
+    def stats(self):
+        return {
+            'datasets': list(self._entries),
+            'used_mb': round(self.used_bytes() / 1024**2, 1),
+            'budget_mb': self.budget / 1024**2,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+# Per allowed dataset: content version and compiled copy (a read-only mapping of shared page cache)
+DATASET_VERSION_CACHE = {}
+COMPILED_DATASET_CACHE = {}
 
 
-def load_test_data(test_data_path):
-    """Load test dataset (images) for evaluation from disk and cache in memory"""
-    global TEST_DATA_CACHE
+def _release_compiled(dataset_id):
+    """Unmap an evicted dataset's compiled copy (mapped again if it is needed later)"""
+    COMPILED_DATASET_CACHE.pop(dataset_id, None)
+
+
+# Loaded once per worker, within DATASET_CACHE_MB
+DATASET_CACHE = DatasetCache(on_evict=_release_compiled)
+
+
+def publish_cache_stats(redis_client, worker_id):
+    """Report this worker's dataset cache stats for monitoring"""
+    stats = dict(DATASET_CACHE.stats(), updated_at=time.time())
+    redis_client.hset(DATASET_CACHE_STATS_KEY, worker_id, json.dumps(stats))
+
+
+def worker_cache_stats(redis_client):
+    """Dataset cache stats of every live worker, by worker id (entries of workers gone are dropped)"""
+    live, gone = {}, []
+    for worker_id, stats in redis_client.hgetall(DATASET_CACHE_STATS_KEY).items():
+        stats = json.loads(stats)
+        if stats.get('updated_at', 0) < time.time() - DATASET_CACHE_STATS_MAX_AGE:
+            gone.append(worker_id)
+        else:
+            live[worker_id] = stats
+    if gone:
+        redis_client.hdel(DATASET_CACHE_STATS_KEY, *gone)
+    return live
+
+
+def compiled_dataset(dataset_id):
+    """The memory-mapped compiled copy of a test set, None when PNGs must be decoded instead"""
+    if dataset_id not in COMPILED_DATASET_CACHE:
+        test_data_path = dataset_path(dataset_id)
+        try:
+            COMPILED_DATASET_CACHE[dataset_id] = dataset_compiler.attach(test_data_path)
+        except Exception as e:
+            logger.warning(f"No compiled dataset for {test_data_path}, decoding PNGs instead: {e}")
+            COMPILED_DATASET_CACHE[dataset_id] = None
+    return COMPILED_DATASET_CACHE[dataset_id]
+
+
+def dataset_version(dataset_id):
+    """
+    Identifier of a test set's contents: its VERSION file if there is one,
+    then the checksum of its compiled copy, otherwise a fingerprint of file
+    names, sizes and modification times
+    """
+    if dataset_id in DATASET_VERSION_CACHE:
+        return DATASET_VERSION_CACHE[dataset_id]
     
+    test_data_path = dataset_path(dataset_id)
+    version_file = Path(test_data_path) / 'VERSION'
+    compiled = compiled_dataset(dataset_id)
+    if version_file.exists():
+        version = version_file.read_text().strip()
+    elif compiled is not None:
+        version = compiled.version
+    else:
+        version = dataset_compiler.source_fingerprint(test_data_path)
+    
+    DATASET_VERSION_CACHE[dataset_id] = version
+    return version
+
+
+def load_test_data(dataset_id):
+    """Load an allowed test set's images for evaluation and keep them in the dataset cache"""
     # Return cached data if available
-    if test_data_path in TEST_DATA_CACHE:
-        logger.info(f"Using cached test data from {test_data_path} with {len(TEST_DATA_CACHE[test_data_path][0])} samples")
-        return TEST_DATA_CACHE[test_data_path]
+    cached = DATASET_CACHE.get(dataset_id, 'test_data')
+    if cached is not None:
+        logger.info(f"Using cached test data {dataset_id} with {len(cached[0])} samples")
+        return cached
+    
+    test_data_path = dataset_path(dataset_id)
+    compiled = compiled_dataset(dataset_id)
+    if compiled is not None:
+        # Shared uint8 mapping, normalized to float32 a batch at a time as it is sliced
+        logger.info(f"Using compiled test set {compiled.version} with {len(compiled.sample_names)} samples")
+        DATASET_CACHE.put(dataset_id, 'test_data', (compiled.images, compiled.sample_names), compiled.images.nbytes)
+        return compiled.images, compiled.sample_names
     
     try:
+        from PIL import Image
         logger.info(f"Loading test images from: {test_data_path}")
         
         # Load all *_image.png files from the test_data directory
@@ -57,7 +218,7 @@ def load_test_data(test_data_path):
         logger.info(f"Loaded test data with shape: {test_data.shape}, dtype: {test_data.dtype}")
         
         # Cache the test data for future use
-        TEST_DATA_CACHE[test_data_path] = (test_data, sample_names)
+        DATASET_CACHE.put(dataset_id, 'test_data', (test_data, sample_names), test_data.nbytes)
         
         return test_data, sample_names
     except Exception as e:
@@ -65,16 +226,22 @@ def load_test_data(test_data_path):
         raise
 
 
-def load_ground_truth(test_data_path, sample_names):
-    """Load ground truth depth maps for evaluation"""
-    global GROUND_TRUTH_CACHE
-    
+def load_ground_truth(dataset_id, sample_names):
+    """Load ground truth depth maps for evaluation and keep them in the dataset cache"""
     # Return cached ground truth if available
-    if test_data_path in GROUND_TRUTH_CACHE:
-        logger.info(f"Using cached ground truth from {test_data_path}")
-        return GROUND_TRUTH_CACHE[test_data_path]
+    cached = DATASET_CACHE.get(dataset_id, 'ground_truth')
+    if cached is not None:
+        logger.info(f"Using cached ground truth {dataset_id}")
+        return cached
+    
+    test_data_path = dataset_path(dataset_id)
+    compiled = compiled_dataset(dataset_id)
+    if compiled is not None:
+        DATASET_CACHE.put(dataset_id, 'ground_truth', compiled.depths, compiled.depths.nbytes)
+        return compiled.depths
     
     try:
+        from PIL import Image
         logger.info(f"Loading ground truth depth maps from: {test_data_path}")
         
         ground_truths = []
@@ -100,7 +267,7 @@ def load_ground_truth(test_data_path, sample_names):
         logger.info(f"Loaded ground truth with shape: {ground_truth_data.shape}, dtype: {ground_truth_data.dtype}")
         
         # Cache the ground truth
-        GROUND_TRUTH_CACHE[test_data_path] = ground_truth_data
+        DATASET_CACHE.put(dataset_id, 'ground_truth', ground_truth_data, ground_truth_data.nbytes)
         
         return ground_truth_data
     except Exception as e:
@@ -0,0 +1,272 @@
+"""Compile test sets into checksummed uint8 binaries that every worker process on a host memory-maps and shares"""
+
+import os
+import sys
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+COMPILED_DATASET_ROOT = os.getenv('COMPILED_DATASET_ROOT', '/app/data/compiled')
+# 'mmap': map the compiled files where they are (the page cache holds one copy per host)
+# 'shm': stage them into DATASET_SHM_DIR first (tmpfs, never paged out to disk)
+DATASET_ATTACH = os.getenv('DATASET_ATTACH', 'mmap')
+DATASET_SHM_DIR = os.getenv('DATASET_SHM_DIR', '/dev/shm/mls-goat-datasets')
+# Compile a test set the first time a worker needs it, if it has no current compiled copy
+DATASET_AUTO_COMPILE = os.getenv('DATASET_AUTO_COMPILE', 'true').lower() in ('1', 'true', 'yes')
+
+FORMAT_VERSION = 1
+IMAGES_FILE = 'images.u8'
+DEPTHS_FILE = 'depths.u8'
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'CURRENT'
+
+
+def dataset_id(test_data_path):
+    """Name compiled copies of a test set are stored under (its directory name)"""
+    return Path(test_data_path).name
+
+
+def source_fingerprint(test_data_path):
+    """Fingerprint of a test set's PNG file names, sizes and modification times"""
+    fingerprint = hashlib.sha256()
+    for path in sorted(Path(test_data_path).glob('*.png')):
+        stat = path.stat()
+        fingerprint.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return fingerprint.hexdigest()[:16]
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(8 * 1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class NormalizedArray:
+    """
+    float32 view of a uint8 array of samples. Samples whose stored values went
+    above 1 are divided by 255 as they are read - exactly what decoding the PNG
+    to float32 and normalizing it did - so only the batch being read is float32.
+    """
+
+    def __init__(self, data, scaled, maximum):
+        self.data = data
+        self.scaled = np.asarray(scaled, dtype=bool)
+        self.maximum = maximum
+        self.shape = data.shape
+        self.dtype = np.dtype(np.float32)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        values = np.asarray(self.data[index], dtype=np.float32)
+        scaled = self.scaled[index]
+        if np.ndim(scaled) == 0:
+            return values / 255.0 if scaled else values
+        values[scaled] /= 255.0
+        return values
+
+    def max(self):
+        return self.maximum
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+
+class CompiledDataset:
+    """A compiled test set, memory-mapped read-only"""
+
+    def __init__(self, directory, manifest):
+        self.directory = Path(directory)
+        self.manifest = manifest
+        self.version = manifest['version']
+        self.sample_names = manifest['sample_names']
+
+        num_samples = manifest['num_samples']
+        images = np.memmap(self.directory / IMAGES_FILE, dtype=np.uint8, mode='r',
+                           shape=(num_samples,) + tuple(manifest['image_shape']))
+        depths = np.memmap(self.directory / DEPTHS_FILE, dtype=np.uint8, mode='r',
+                           shape=(num_samples,) + tuple(manifest['depth_shape']))
+        self.images = NormalizedArray(images, manifest['image_scaled'], manifest['image_max'])
+        self.depths = NormalizedArray(depths, manifest['depth_scaled'], manifest['depth_max'])
+
+    @property
+    def nbytes(self):
+        return self.images.nbytes + self.depths.nbytes
+
+
+def compile_dataset(test_data_path, root=COMPILED_DATASET_ROOT):
+    """
+    Decode a test set's *_image.png / *_depth_map.png pairs once into
+    <root>/<dataset id>/<version>/ and make it the current compiled copy.
+    The version is a checksum of the contents. Returns the version directory.
+    """
+    from PIL import Image
+
+    image_files = sorted(Path(test_data_path).glob('*_image.png'))
+    if not image_files:
+        raise ValueError(f"No *_image.png files found in {test_data_path}")
+    sample_names = [path.stem.replace('_image', '') for path in image_files]
+    source = source_fingerprint(test_data_path)
+
+    height, width = np.array(Image.open(image_files[0]).convert('RGB')).shape[:2]
+    num_samples = len(image_files)
+    logger.info(f"Compiling {num_samples} samples ({height}x{width}) from {test_data_path}")
+
+    dataset_dir = Path(root) / dataset_id(test_data_path)
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+    tmp_dir = dataset_dir / f".tmp-{uuid.uuid4().hex}"
+    tmp_dir.mkdir()
+    try:
+        images = np.memmap(tmp_dir / IMAGES_FILE, dtype=np.uint8, mode='w+', shape=(num_samples, 3, height, width))
+        depths = np.memmap(tmp_dir / DEPTHS_FILE, dtype=np.uint8, mode='w+', shape=(num_samples, height, width))
+        image_scaled, depth_scaled = [], []
+        image_max, depth_max = 0.0, 0.0
+
+        for i, (image_path, sample_name) in enumerate(zip(image_files, sample_names)):
+            image = np.array(Image.open(image_path).convert('RGB'))
+            if image.shape != (height, width, 3):
+                raise ValueError(f"{image_path.name} is {image.shape[1]}x{image.shape[0]}, expected {width}x{height}")
+            depth_path = Path(test_data_path) / f"{sample_name}_depth_map.png"
+            if not depth_path.exists():
+                raise ValueError(f"Ground truth not found: {depth_path}")
+            depth = np.array(Image.open(depth_path).convert('L'))
+            if depth.shape != (height, width):
+                raise ValueError(f"{depth_path.name} is {depth.shape[1]}x{depth.shape[0]}, expected {width}x{height}")
+
+            images[i] = np.transpose(image, (2, 0, 1))
+            depths[i] = depth
+            # Same rule as decoding to float32: values above 1 mean 0-255 and get divided by 255
+            image_scaled.append(bool(image.max() > 1))
+            depth_scaled.append(bool(depth.max() > 1))
+            image_max = max(image_max, image.max() / 255.0 if image_scaled[-1] else float(image.max()))
+            depth_max = max(depth_max, depth.max() / 255.0 if depth_scaled[-1] else float(depth.max()))
+
+        images.flush()
+        depths.flush()
+        del images, depths
+
+        checksums = {name: _sha256(tmp_dir / name) for name in (IMAGES_FILE, DEPTHS_FILE)}
+        content = hashlib.sha256(json.dumps(
+            [checksums, sample_names, image_scaled, depth_scaled], sort_keys=True
+        ).encode())
+        version = content.hexdigest()[:16]
+
+        manifest = {
+            'format': FORMAT_VERSION,
+            'version': version,
+            'source': source,
+            'num_samples': num_samples,
+            'sample_names': sample_names,
+            'image_shape': [3, height, width],
+            'depth_shape': [height, width],
+            'image_scaled': image_scaled,
+            'depth_scaled': depth_scaled,
+            'image_max': float(image_max),
+            'depth_max': float(depth_max),
+            'sha256': checksums,
+        }
+        # The manifest is written last: a directory with one is complete
+        (tmp_dir / MANIFEST_FILE).write_text(json.dumps(manifest))
+
+        version_dir = dataset_dir / version
+        try:
+            os.rename(tmp_dir, version_dir)
+        except OSError:
+            # Same contents already compiled (by another worker, or before the PNGs were touched)
+            if not (version_dir / MANIFEST_FILE).exists():
+                raise
+            os.replace(tmp_dir / MANIFEST_FILE, version_dir / MANIFEST_FILE)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    current_tmp = dataset_dir / f".{CURRENT_FILE}.{uuid.uuid4().hex}"
+    current_tmp.write_text(version)
+    os.replace(current_tmp, dataset_dir / CURRENT_FILE)
+
+    logger.info(f"Compiled {test_data_path} as {dataset_dir.name}/{version}")
+    return version_dir
+
+
+def verify(directory, manifest):
+    """Check the compiled files against the manifest's checksums"""
+    for name, checksum in manifest['sha256'].items():
+        if _sha256(Path(directory) / name) != checksum:
+            raise ValueError(f"Checksum mismatch for {Path(directory) / name}")
+
+
+def current_manifest(test_data_path, root=COMPILED_DATASET_ROOT):
+    """(directory, manifest) of the current compiled copy, None if there is none or the PNGs changed since"""
+    dataset_dir = Path(root) / dataset_id(test_data_path)
+    try:
+        version = (dataset_dir / CURRENT_FILE).read_text().strip()
+        directory = dataset_dir / version
+        manifest = json.loads((directory / MANIFEST_FILE).read_text())
+    except FileNotFoundError:
+        return None
+
+    if manifest.get('format') != FORMAT_VERSION:
+        return None
+    if Path(test_data_path).is_dir() and manifest['source'] != source_fingerprint(test_data_path):
+        logger.info(f"Compiled copy of {test_data_path} is stale")
+        return None
+    return directory, manifest
+
+
+def _stage_in_shm(directory, manifest):
+    """Copy compiled files into shared memory once per host; returns the directory to map"""
+    target = Path(DATASET_SHM_DIR) / manifest['version']
+    if (target / MANIFEST_FILE).exists():
+        return target
+
+    tmp_dir = Path(DATASET_SHM_DIR) / f".tmp-{uuid.uuid4().hex}"
+    try:
+        tmp_dir.mkdir(parents=True)
+        for name in manifest['sha256']:
+            shutil.copyfile(Path(directory) / name, tmp_dir / name)
+        verify(tmp_dir, manifest)
+        shutil.copyfile(Path(directory) / MANIFEST_FILE, tmp_dir / MANIFEST_FILE)
+        os.rename(tmp_dir, target)
+        logger.info(f"Staged dataset {manifest['version']} in {target}")
+        return target
+    except OSError as e:
+        if (target / MANIFEST_FILE).exists():
+            return target  # Another process staged it first
+        logger.warning(f"Could not stage dataset in {DATASET_SHM_DIR}, mapping it from disk: {e}")
+        return directory
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def attach(test_data_path, root=COMPILED_DATASET_ROOT, compile_missing=DATASET_AUTO_COMPILE):
+    """Memory-map the current compiled copy of a test set (compiling it first if allowed); None if unavailable"""
+    current = current_manifest(test_data_path, root)
+    if current is None:
+        if not compile_missing:
+            return None
+        compile_dataset(test_data_path, root)
+        current = current_manifest(test_data_path, root)
+
+    directory, manifest = current
+    if DATASET_ATTACH == 'shm':
+        directory = _stage_in_shm(directory, manifest)
+    return CompiledDataset(directory, manifest)
+
+
+if __name__ == '__main__':
+    # python dataset_compiler.py <test data dir> [...]
+    logging.basicConfig(level=logging.INFO)
+    for path in sys.argv[1:]:
+        version_dir = compile_dataset(path)
+        verify(version_dir, json.loads((version_dir / MANIFEST_FILE).read_text()))
+        print(f"{path} -> {version_dir}")
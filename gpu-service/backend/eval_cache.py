@@ -0,0 +1,35 @@
+"""Cache of evaluation results for byte-identical models"""
+
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVAL_CACHE_TTL = int(os.getenv('EVAL_CACHE_TTL', 7 * 24 * 3600))  # seconds
+# On a cache hit, still re-run the timed passes (accuracy is taken from the cache)
+EVAL_CACHE_RETIME = os.getenv('EVAL_CACHE_RETIME', 'false').lower() in ('1', 'true', 'yes')
+
+# Results that depend on the model and data only; everything else is timing
+ACCURACY_FIELDS = ('rmse', 'accuracy_score', 'mean_depth', 'std_depth', 'per_sample_rmse', 'num_samples')
+
+
+def cache_key(model_hash, dataset_version, batch_size, execution_provider):
+    return f'eval_cache:{model_hash}:{dataset_version}:{batch_size}:{execution_provider}'
+
+
+def get(redis_client, key):
+    """Cached evaluation results, None on a miss"""
+    try:
+        cached = redis_client.get(key)
+    except Exception as e:
+        logger.warning(f"Eval cache lookup failed: {e}")
+        return None
+    return json.loads(cached) if cached else None
+
+
+def put(redis_client, key, results):
+    try:
+        redis_client.set(key, json.dumps(results), ex=EVAL_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Failed to cache evaluation results: {e}")
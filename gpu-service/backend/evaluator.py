@@ -8,10 +8,14 @@ import onnxruntime as ort
 import logging
 
 from data_loader import load_test_data, load_ground_truth
-from scorer import calculate_rmse
+from scorer import RMSEAccumulator
+import job_state
 
 logger = logging.getLogger(__name__)
 
+# Keep test batches on the device and time only run_with_iobinding (instead of session.run on host arrays)
+EVAL_IO_BINDING = os.getenv('EVAL_IO_BINDING', 'true').lower() in ('1', 'true', 'yes')
+
 
 def configure_onnx_gpu(gpu_memory_fraction):
     """Configure ONNX Runtime to use limited GPU memory with optimizations"""
@@ -49,28 +53,130 @@ def normalize(x):
     # Reshape back to original shape
     return x_flat_normalized.reshape(x.shape)
 
-def run_inference_batch(session, input_name, output_name, test_data, batch_size=8):
-    """Run inference on test data with precise timing"""
+def run_inference_batch(session, input_name, output_name, test_data, batch_size=8, on_batch=None):
+    """
+    Warmup pass: run every batch once. Only session.run is inside the timer;
+    on_batch(predictions, offset), if given, receives each batch's normalized
+    predictions outside it. Returns (inference_time, num_samples).
+    """
     num_samples = len(test_data) if hasattr(test_data, '__len__') else test_data.shape[0]
-    predictions = []
-    
-    inference_start = time.perf_counter()
+    inference_time = 0.0
     
     for i in range(0, num_samples, batch_size):
         batch = test_data[i:i+batch_size]
+        run_start = time.perf_counter()
         outputs = session.run([output_name], {input_name: batch})
-        normalized_outputs = normalize(outputs[0])
-        predictions.append(normalized_outputs)
+        inference_time += time.perf_counter() - run_start
+        
+        if on_batch is not None:
+            on_batch(normalize(outputs[0]), i)
+    
+    return inference_time, num_samples
+
+
+def time_inference_pass(session, input_name, output_name, test_data, batch_size=8):
+    """Timed pass with session.run: outputs are dropped as they come and only the runs are timed (not slicing a batch out of the test set)"""
+    num_samples = len(test_data) if hasattr(test_data, '__len__') else test_data.shape[0]
+    
+    inference_time = 0.0
+    
+    for i in range(0, num_samples, batch_size):
+        batch = test_data[i:i+batch_size]
+        run_start = time.perf_counter()
+        session.run([output_name], {input_name: batch})
+        inference_time += time.perf_counter() - run_start
+    
+    return inference_time
+
+
+def _binding_device(session):
+    """OrtValue device type and id of the execution provider the session runs on"""
+    provider = session.get_providers()[0]
+    if provider == 'CUDAExecutionProvider':
+        return 'cuda', int(session.get_provider_options()[provider].get('device_id', 0))
+    return 'cpu', 0
+
+
+def bind_test_data(session, input_name, output_name, test_data, batch_size=8):
+    """
+    Copy every test batch to the inference device once and give it an IOBinding.
+    Each binding keeps the output buffer ORT allocated on the first (warmup) run
+    of its batch, so timed passes neither copy inputs in nor allocate outputs.
+    Returns (bindings, num_samples, warmup inference time).
+    """
+    device_type, device_id = _binding_device(session)
+    num_samples = len(test_data) if hasattr(test_data, '__len__') else test_data.shape[0]
+    bindings = []
+    inference_time = 0.0
+    
+    for i in range(0, num_samples, batch_size):
+        batch = np.ascontiguousarray(test_data[i:i+batch_size], dtype=np.float32)
+        input_value = ort.OrtValue.ortvalue_from_numpy(batch, device_type, device_id)
+        
+        binding = session.io_binding()
+        binding.bind_ortvalue_input(input_name, input_value)
+        binding.bind_output(output_name, device_type, device_id)
+        run_start = time.perf_counter()
+        session.run_with_iobinding(binding)
+        inference_time += time.perf_counter() - run_start
+        
+        output_value = binding.get_outputs()[0]
+        binding.clear_binding_outputs()
+        binding.bind_ortvalue_output(output_name, output_value)
+        # On CPU the input OrtValue wraps `batch` without copying and needs it alive; on a GPU it
+        # holds its own device copy, so the host float32 batch is dropped (only the shared uint8 data stays)
+        bindings.append((binding, batch if device_type == 'cpu' else None, input_value, output_value))
     
-    inference_time = time.perf_counter() - inference_start
+    return bindings, num_samples, inference_time
+
+
+def replay_bound_outputs(bindings, on_batch):
+    """Pass the predictions left in the bound output buffers to on_batch(predictions, offset), normalized"""
+    offset = 0
     
-    predictions = np.concatenate(predictions, axis=0)
-    return predictions, inference_time, num_samples
+    for _, _, _, output_value in bindings:
+        output = output_value.numpy()
+        on_batch(normalize(output), offset)
+        offset += len(output)
+
 
+def run_inference_bound(session, bindings):
+    """Timed pass over device-resident batches: only model execution is inside the timer"""
+    inference_start = time.perf_counter()
+    
+    for binding, _, _, _ in bindings:
+        session.run_with_iobinding(binding)
+        binding.synchronize_outputs()
+    
+    return time.perf_counter() - inference_start
 
-def evaluate_model(model_path, test_data_path, batch_size, gpu_memory_fraction):
-    """Evaluate ONNX model on test dataset with warmup and multiple runs"""
+
+def execution_provider():
+    """
+    Execution provider evaluations on this worker are expected to run on (part of
+    the eval cache key): the first configured one this onnxruntime build offers.
+    The provider a session really used is reported in the results.
+    """
+    providers, _, _ = configure_onnx_gpu(0)
+    available = ort.get_available_providers()
+    return next((provider for provider in providers if provider in available), 'CPUExecutionProvider')
+
+
+def evaluate_model(model_path, dataset, batch_size, gpu_memory_fraction, progress=None, measure_accuracy=True):
+    """
+    Evaluate ONNX model on test dataset with warmup and multiple runs
+    
+    dataset: id of an allowed test set (data_loader.DATASETS)
+    progress: optional callable(state, **fields) notified on each stage
+              (loading, warmup, pass k/5, scoring)
+    measure_accuracy: when False only timing is measured (no ground truth, no RMSE)
+    """
+    if progress is None:
+        progress = lambda state, **fields: None
+    
     try:
+        progress(job_state.LOADING)
+        
         # Configure ONNX Runtime
         providers, provider_options, sess_options = configure_onnx_gpu(gpu_memory_fraction)
         
@@ -83,7 +189,7 @@ def evaluate_model(model_path, test_data_path, batch_size, gpu_memory_fraction):
             provider_options=provider_options
         )
         model_load_time = time.perf_counter() - model_load_start
-        logger.info(f"Model loaded in {model_load_time:.2f}s")
+        logger.info(f"Model loaded in {model_load_time:.2f}s on {session.get_providers()[0]}")
         
         # Get input/output names
         input_name = session.get_inputs()[0].name
@@ -93,17 +199,34 @@ def evaluate_model(model_path, test_data_path, batch_size, gpu_memory_fraction):
         
         # Load test data (cached after first load)
         data_load_start = time.perf_counter()
-        test_data, sample_names = load_test_data(test_data_path)
-        ground_truth = load_ground_truth(test_data_path, sample_names)
+        test_data, sample_names = load_test_data(dataset)
+        if measure_accuracy:
+            ground_truth = load_ground_truth(dataset, sample_names)
         data_load_time = time.perf_counter() - data_load_start
         logger.info(f"Test data and ground truth loaded in {data_load_time:.2f}s")
         
         logger.info(f"Using batch size: {batch_size}")
         
-        # WARMUP RUN - not counted in scoring
+        # WARMUP RUN - not counted in scoring; predictions are scored here, once, a batch at a time
+        progress(job_state.WARMUP)
         logger.info("Running warmup inference...")
+        accuracy = RMSEAccumulator(ground_truth) if measure_accuracy else None
+        on_batch = accuracy.update if accuracy else None
         warmup_start = time.perf_counter()
-        predictions, warm_time, _ = run_inference_batch(session, input_name, output_name, test_data, batch_size)
+        bindings = None
+        if EVAL_IO_BINDING:
+            try:
+                bindings, num_samples, warm_time = bind_test_data(session, input_name, output_name, test_data, batch_size)
+                logger.info(f"Bound {len(bindings)} test batches to {_binding_device(session)[0]}")
+            except Exception as e:
+                logger.warning(f"IOBinding unavailable, timing session.run instead: {e}")
+                bindings = None
+        if bindings is None:
+            warm_time, num_samples = run_inference_batch(
+                session, input_name, output_name, test_data, batch_size, on_batch=on_batch
+            )
+        elif on_batch is not None:
+            replay_bound_outputs(bindings, on_batch)
         warmup_time = time.perf_counter() - warmup_start
         logger.info(f"Warmup completed in {warmup_time:.2f}s")
         
@@ -111,15 +234,18 @@ def evaluate_model(model_path, test_data_path, batch_size, gpu_memory_fraction):
             error_msg = f"Warmup inference time {warm_time:.2f}s exceeds 13s limit for warmup run"
             logger.error(error_msg)
             raise ValueError(error_msg)
+        
         # FIVE MEASURED RUNS - average these for scoring
         logger.info("Running 5 measured inference passes...")
         inference_times = []
         
         for run_num in range(5):
+            progress(job_state.PASS, **{'pass': run_num + 1, 'passes': 5})
             logger.info(f"Running inference pass {run_num + 1}/5...")
-            _, inference_time, num_samples = run_inference_batch(
-                session, input_name, output_name, test_data, batch_size
-            )
+            if bindings is not None:
+                inference_time = run_inference_bound(session, bindings)
+            else:
+                inference_time = time_inference_pass(session, input_name, output_name, test_data, batch_size)
             
             # Check inference time limit (10 seconds per run)
             if inference_time > 510.0:
@@ -130,30 +256,19 @@ def evaluate_model(model_path, test_data_path, batch_size, gpu_memory_fraction):
             inference_times.append(inference_time)
             logger.info(f"Pass {run_num + 1} completed in {inference_time:.4f}s")
         
+        io_binding = bindings is not None
+        del bindings  # Release the device copies of the test set
+        
         # Calculate average inference time
         avg_inference_time = np.median(inference_times)
         std_inference_time = np.std(inference_times)
         
         logger.info(f"Average inference time: {avg_inference_time:.4f}s ± {std_inference_time:.4f}s")
         
-        # Calculate RMSE accuracy
-        rmse = calculate_rmse(predictions, ground_truth)
-        accuracy_score = 4.0 / (4.0 + (10*rmse)**2)
-        
-        logger.info(f"RMSE: {rmse:.6f}, Accuracy Score: {accuracy_score:.6f}")
-        
-        # Calculate additional metrics
-        mean_depth = float(np.mean(predictions))
-        std_depth = float(np.std(predictions))
-        
         # Calculate model size
         model_size_mb = os.path.getsize(model_path) / (1024 * 1024)
         
         results = {
-            'rmse': rmse,
-            'accuracy_score': accuracy_score,
-            'mean_depth': mean_depth,
-            'std_depth': std_depth,
             'inference_time': avg_inference_time,  # Average of 3 runs
             'inference_time_std': std_inference_time,
             'inference_times_all': inference_times,  # All 3 times for transparency
@@ -165,8 +280,27 @@ def evaluate_model(model_path, test_data_path, batch_size, gpu_memory_fraction):
             'model_load_time': model_load_time,
             'data_load_time': data_load_time,
             'warmup_time': warmup_time,
+            'io_binding': io_binding,
+            'execution_provider': session.get_providers()[0],
         }
         
+        if measure_accuracy:
+            # RMSE accuracy, accumulated during warmup
+            progress(job_state.SCORING)
+            rmse = accuracy.rmse()
+            accuracy_score = 4.0 / (4.0 + (10*rmse)**2)
+            
+            logger.info(f"RMSE: {rmse:.6f}, Accuracy Score: {accuracy_score:.6f}")
+            
+            # Calculate additional metrics
+            results.update({
+                'rmse': rmse,
+                'accuracy_score': accuracy_score,
+                'mean_depth': accuracy.mean_depth(),
+                'std_depth': accuracy.std_depth(),
+                'per_sample_rmse': dict(zip(sample_names, accuracy.per_sample_rmse())),
+            })
+        
         logger.info(f"Evaluation complete: {json.dumps(results, indent=2)}")
         return results
         
@@ -0,0 +1,422 @@
+"""Reliable evaluation queue on Redis Streams with consumer groups"""
+
+import os
+import json
+import time
+import threading
+import logging
+from dataclasses import dataclass
+from contextlib import contextmanager
+
+import redis
+
+import cost_model
+import job_state
+import model_store
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = 'evaluation_stream'
+# List the queue lived in before it moved to the stream (LPUSH / BRPOP)
+LEGACY_QUEUE_KEY = 'evaluation_queue'
+CONSUMER_GROUP = 'evaluators'
+DEAD_LETTER_KEY = 'evaluation_dead_letter'
+# Waiting jobs live in the scheduler below and only enter the stream when a worker is ready for them.
+# Regular jobs by weighted fair queueing tag - each team is served in turn, in proportion to its weight
+QUEUE_INDEX_KEY = 'evaluation_queue:order'
+# Admin / private re-evaluation jobs, in arrival order, served before regular ones
+PRIORITY_QUEUE_KEY = 'evaluation_queue:priority'
+# Regular jobs by arrival time, for aging
+ARRIVALS_KEY = 'evaluation_queue:arrivals'
+QUEUE_SEQ_KEY = 'evaluation_queue:seq'
+VIRTUAL_TIME_KEY = 'evaluation_queue:vtime'
+TEAM_TAGS_KEY = 'evaluation_queue:team_tags'
+# Per-team weight overrides (team_id -> weight), e.g. HSET evaluation_queue:weights 7 2
+TEAM_WEIGHTS_KEY = 'evaluation_queue:weights'
+# Wakes up idle workers when a job is scheduled
+WAKEUP_KEY = 'evaluation_queue:wakeup'
+# Sum of the predicted cost (seconds) of every scheduled job
+BACKLOG_KEY = 'evaluation_queue:backlog'
+
+# A delivered job that is not acked or heartbeated within this time is handed to another worker
+JOB_VISIBILITY_TIMEOUT = int(os.getenv('JOB_VISIBILITY_TIMEOUT', 300))  # seconds
+JOB_HEARTBEAT_INTERVAL = max(1, JOB_VISIBILITY_TIMEOUT // 3)  # seconds
+# Deliveries after which a job is considered poisonous (e.g. it keeps crashing its worker)
+JOB_MAX_DELIVERIES = int(os.getenv('JOB_MAX_DELIVERIES', 3))
+TEAM_WEIGHT_DEFAULT = float(os.getenv('TEAM_WEIGHT_DEFAULT', 1))
+# A regular job waiting longer than this is dispatched next, ahead of everything else
+QUEUE_AGING_THRESHOLD = int(os.getenv('QUEUE_AGING_THRESHOLD', 1800))  # seconds
+
+
+@dataclass
+class JobLease:
+    """A job delivered to one consumer, owned by it until acked or reclaimed"""
+    message_id: str
+    job_data: dict
+    deliveries: int = 1
+
+
+def ensure_consumer_group(redis_client):
+    """
+    Create the stream and consumer group if they don't exist yet, and drop
+    consumers left behind by exited workers (idle, with nothing pending)
+    """
+    try:
+        redis_client.xgroup_create(STREAM_KEY, CONSUMER_GROUP, id='0', mkstream=True)
+    except redis.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+    for consumer in redis_client.xinfo_consumers(STREAM_KEY, CONSUMER_GROUP):
+        if consumer['pending'] == 0 and consumer['idle'] > JOB_VISIBILITY_TIMEOUT * 1000:
+            redis_client.xgroup_delconsumer(STREAM_KEY, CONSUMER_GROUP, consumer['name'])
+
+
+# Oldest first, as the old workers popped them. Each job takes a reference on its
+# model (older versions took none), so the model store keeps the file until it ran.
+_MIGRATE_LEGACY_SCRIPT = """
+local moved = 0
+while true do
+    local payload = redis.call('RPOP', KEYS[1])
+    if not payload then
+        return moved
+    end
+    redis.call('XADD', KEYS[2], '*', 'job', payload)
+    local ok, job = pcall(cjson.decode, payload)
+    if ok and type(job) == 'table' and type(job.model_path) == 'string' then
+        redis.call('HINCRBY', KEYS[3], job.model_path, 1)
+    end
+    moved = moved + 1
+end
+"""
+
+
+def migrate_legacy_queue(redis_client):
+    """Move jobs still waiting in the pre-stream list into the stream; returns how many were moved"""
+    migrate_script = redis_client.register_script(_MIGRATE_LEGACY_SCRIPT)
+    moved = migrate_script(keys=[LEGACY_QUEUE_KEY, STREAM_KEY, model_store.JOB_REFS_KEY])
+    if moved:
+        logger.info(f"Moved {moved} job(s) from the legacy {LEGACY_QUEUE_KEY} list into the stream")
+    return moved
+
+
+# Job payload, scheduler entry and initial job state are written atomically,
+# so the returned position is exact even with concurrent submissions. The rank
+# counts regular jobs already past the aging threshold (ARGV[8]) first, as dispatch does.
+# Regular jobs get a virtual finish tag: start at the later of the global virtual
+# time and the team's previous tag, plus cost / weight. Ordering by tag serves the
+# teams' sub-queues round-robin (weighted), however many jobs one team has queued.
+_ENQUEUE_SCRIPT = """
+local submission_id, team_id, now = ARGV[2], ARGV[3], ARGV[4]
+local seq = redis.call('INCR', KEYS[4])
+redis.call('HSET', KEYS[5], 'state', 'queued', 'queued_at', now, 'updated_at', now,
+           'team_id', team_id, 'job', ARGV[1], 'cost', ARGV[6])
+redis.call('INCRBYFLOAT', KEYS[10], ARGV[6])
+redis.call('LPUSH', KEYS[9], 1)
+redis.call('LTRIM', KEYS[9], 0, 99)
+
+local aged = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[8])
+if ARGV[5] == '1' then
+    redis.call('ZADD', KEYS[2], seq, submission_id)
+    return #aged + redis.call('ZRANK', KEYS[2], submission_id)
+end
+
+local vtime = tonumber(redis.call('GET', KEYS[6]) or '0')
+local last_tag = tonumber(redis.call('HGET', KEYS[7], team_id) or '0')
+local weight = tonumber(redis.call('HGET', KEYS[8], team_id) or ARGV[7])
+local start = math.max(vtime, last_tag)
+local tag = start + tonumber(ARGV[6]) / weight
+redis.call('HSET', KEYS[7], team_id, tag)
+redis.call('HSET', KEYS[5], 'start_tag', start)
+redis.call('ZADD', KEYS[1], tag, submission_id)
+redis.call('ZADD', KEYS[3], now, submission_id)
+local rank = redis.call('ZRANK', KEYS[1], submission_id)
+for _, aged_id in ipairs(aged) do
+    -- Aged jobs are counted once, in front, not again among the regular ones
+    local aged_rank = redis.call('ZRANK', KEYS[1], aged_id)
+    if aged_rank and aged_rank < rank then
+        rank = rank - 1
+    end
+end
+return #aged + redis.call('ZCARD', KEYS[2]) + rank
+"""
+
+
+def enqueue(redis_client, job_data, priority=False, cost=1.0):
+    """
+    Schedule a job, returns its 1-based queue position.
+    `priority` puts it in the admin/private class, served before regular jobs.
+    """
+    submission_id = job_data['submission_id']
+    enqueue_script = redis_client.register_script(_ENQUEUE_SCRIPT)
+    rank = enqueue_script(
+        keys=[QUEUE_INDEX_KEY, PRIORITY_QUEUE_KEY, ARRIVALS_KEY, QUEUE_SEQ_KEY,
+              job_state.job_key(submission_id), VIRTUAL_TIME_KEY, TEAM_TAGS_KEY, TEAM_WEIGHTS_KEY, WAKEUP_KEY,
+              BACKLOG_KEY],
+        args=[json.dumps(job_data), submission_id, job_data.get('team_id', ''), time.time(),
+              1 if priority else 0, cost, TEAM_WEIGHT_DEFAULT, time.time() - QUEUE_AGING_THRESHOLD]
+    )
+    return rank + 1
+
+
+# Moves the next job from the scheduler into the stream, where the consumer group
+# delivers it. Order: regular jobs waiting past the aging threshold, then the
+# priority class, then regular jobs by tag.
+_DISPATCH_SCRIPT = """
+local now = tonumber(ARGV[1])
+local submission_id
+local oldest = redis.call('ZRANGE', KEYS[3], 0, 0, 'WITHSCORES')
+if oldest[1] and tonumber(oldest[2]) <= now - tonumber(ARGV[2]) then
+    submission_id = oldest[1]
+end
+if not submission_id then
+    submission_id = redis.call('ZRANGE', KEYS[2], 0, 0)[1]
+end
+if not submission_id then
+    submission_id = redis.call('ZRANGE', KEYS[1], 0, 0)[1]
+end
+if not submission_id then
+    return false
+end
+
+redis.call('ZREM', KEYS[1], submission_id)
+redis.call('ZREM', KEYS[2], submission_id)
+redis.call('ZREM', KEYS[3], submission_id)
+
+local job_key = ARGV[3] .. submission_id
+local cost = tonumber(redis.call('HGET', job_key, 'cost') or '0')
+if tonumber(redis.call('INCRBYFLOAT', KEYS[6], -cost)) < 0 then
+    redis.call('SET', KEYS[6], 0)
+end
+local start = tonumber(redis.call('HGET', job_key, 'start_tag') or '0')
+local vtime = tonumber(redis.call('GET', KEYS[4]) or '0')
+if start > vtime then
+    redis.call('SET', KEYS[4], start)
+end
+
+local payload = redis.call('HGET', job_key, 'job')
+if not payload then
+    -- Job hash gone (e.g. deleted while queued) - nothing to run
+    return submission_id
+end
+local message_id = redis.call('XADD', KEYS[5], '*', 'job', payload)
+redis.call('HSET', job_key, 'message_id', message_id, 'dispatched_at', ARGV[1])
+return submission_id
+"""
+
+
+def dispatch(redis_client):
+    """Move the next scheduled job into the stream; returns its submission id, None if nothing is waiting"""
+    dispatch_script = redis_client.register_script(_DISPATCH_SCRIPT)
+    return dispatch_script(
+        keys=[QUEUE_INDEX_KEY, PRIORITY_QUEUE_KEY, ARRIVALS_KEY, VIRTUAL_TIME_KEY, STREAM_KEY, BACKLOG_KEY],
+        args=[time.time(), QUEUE_AGING_THRESHOLD, job_state.job_key('')]
+    )
+
+
+# Jobs ahead of one in the scheduler, in the order _DISPATCH_SCRIPT would hand
+# them out if nothing else arrived: aged regular jobs by arrival, the priority
+# class, then the other regular jobs by tag. Returns {position, their summed cost}
+# (the cost as a string, Lua numbers would be truncated), false once dispatched.
+_POSITION_SCRIPT = """
+local submission_id = ARGV[1]
+local aged = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[2])
+local ahead, is_aged, found = {}, {}, false
+for _, aged_id in ipairs(aged) do
+    if aged_id == submission_id then
+        found = true
+        break
+    end
+    ahead[#ahead + 1] = aged_id
+    is_aged[aged_id] = true
+end
+
+if not found then
+    for _, aged_id in ipairs(aged) do
+        is_aged[aged_id] = true
+    end
+    local priority_rank = redis.call('ZRANK', KEYS[2], submission_id)
+    local rank = redis.call('ZRANK', KEYS[1], submission_id)
+    -- (ZRANGE 0 -1 is the whole set, so a rank of 0 must not reach it)
+    if priority_rank then
+        if priority_rank > 0 then
+            for _, job_id in ipairs(redis.call('ZRANGE', KEYS[2], 0, priority_rank - 1)) do
+                ahead[#ahead + 1] = job_id
+            end
+        end
+    elseif rank then
+        for _, job_id in ipairs(redis.call('ZRANGE', KEYS[2], 0, -1)) do
+            ahead[#ahead + 1] = job_id
+        end
+        if rank > 0 then
+            for _, job_id in ipairs(redis.call('ZRANGE', KEYS[1], 0, rank - 1)) do
+                if not is_aged[job_id] then
+                    ahead[#ahead + 1] = job_id
+                end
+            end
+        end
+    else
+        return false
+    end
+end
+
+local cost = 0
+for _, job_id in ipairs(ahead) do
+    cost = cost + tonumber(redis.call('HGET', ARGV[3] .. job_id, 'cost') or '0')
+end
+return {#ahead + 1, tostring(cost)}
+"""
+
+
+def _position(redis_client, submission_id):
+    """(1-based position, predicted cost of the jobs ahead) of a scheduled job, None once dispatched"""
+    position_script = redis_client.register_script(_POSITION_SCRIPT)
+    result = position_script(
+        keys=[QUEUE_INDEX_KEY, PRIORITY_QUEUE_KEY, ARRIVALS_KEY],
+        args=[submission_id, time.time() - QUEUE_AGING_THRESHOLD, job_state.job_key('')]
+    )
+    if not result:
+        return None
+    position, ahead_cost = result
+    return position, float(ahead_cost)
+
+
+def queue_position(redis_client, submission_id):
+    """
+    1-based position of a job among those not yet dispatched, None once a worker has it.
+    Follows the dispatch order as it stands; a job crossing the aging threshold
+    later can still move ahead.
+    """
+    position = _position(redis_client, submission_id)
+    return None if position is None else position[0]
+
+
+def backlog_seconds(redis_client):
+    """Predicted evaluation time of every job still waiting to be dispatched"""
+    return max(0.0, float(redis_client.get(BACKLOG_KEY) or 0))
+
+
+def estimated_wait(redis_client, submission_id=None):
+    """
+    Seconds until a queued job (or, without one, a job submitted now) starts:
+    predicted cost of the jobs ahead of it divided by the active workers' throughput.
+    """
+    if submission_id is None:
+        ahead = backlog_seconds(redis_client)
+    else:
+        position = _position(redis_client, submission_id)
+        if position is None:
+            return 0.0
+        ahead = position[1]
+    return ahead / cost_model.capacity(redis_client)
+
+
+def pending_count(redis_client):
+    """Jobs delivered to a worker but not acked yet"""
+    try:
+        return redis_client.xpending(STREAM_KEY, CONSUMER_GROUP)['pending']
+    except redis.ResponseError:
+        return 0
+
+
+def queue_length(redis_client):
+    """Jobs waiting to be delivered: scheduled ones plus dispatched ones no worker has read yet"""
+    pipe = redis_client.pipeline()
+    pipe.zcard(PRIORITY_QUEUE_KEY)
+    pipe.zcard(QUEUE_INDEX_KEY)
+    pipe.xlen(STREAM_KEY)
+    priority_count, regular_count, stream_length = pipe.execute()
+    # Acked jobs are deleted from the stream, so what's left is unread or pending
+    return priority_count + regular_count + max(0, stream_length - pending_count(redis_client))
+
+
+def _delivery_count(redis_client, message_id):
+    entries = redis_client.xpending_range(STREAM_KEY, CONSUMER_GROUP, min=message_id, max=message_id, count=1)
+    return entries[0]['times_delivered'] if entries else 1
+
+
+def _to_lease(redis_client, message_id, fields):
+    if not fields or 'job' not in fields:
+        # Deleted from the stream while pending - nothing left to run
+        redis_client.xack(STREAM_KEY, CONSUMER_GROUP, message_id)
+        return None
+    job_data = json.loads(fields['job'])
+    return JobLease(message_id, job_data, _delivery_count(redis_client, message_id))
+
+
+def reclaim_stalled(redis_client, consumer):
+    """Take over one job whose worker stopped heartbeating (crashed, restarted, hung)"""
+    _, messages, _ = redis_client.xautoclaim(
+        STREAM_KEY, CONSUMER_GROUP, consumer,
+        min_idle_time=JOB_VISIBILITY_TIMEOUT * 1000, start_id='0-0', count=1
+    )
+    for message_id, fields in messages:
+        lease = _to_lease(redis_client, message_id, fields)
+        if lease:
+            logger.warning(f"Reclaimed stalled job {message_id} (delivery {lease.deliveries})")
+            return lease
+    return None
+
+
+def claim_next(redis_client, consumer, block_ms=5000):
+    """
+    Return the next JobLease for this consumer, or None after `block_ms` without work.
+    Stalled jobs are reclaimed before new ones are scheduled.
+    """
+    lease = reclaim_stalled(redis_client, consumer)
+    if lease:
+        return lease
+
+    if dispatch(redis_client) is None:
+        # Nothing scheduled - sleep until a submission arrives
+        redis_client.blpop(WAKEUP_KEY, timeout=max(1, block_ms // 1000))
+        dispatch(redis_client)
+
+    # Also picks up jobs dispatched by a worker that died before reading them
+    response = redis_client.xreadgroup(CONSUMER_GROUP, consumer, {STREAM_KEY: '>'}, count=1)
+    for _, messages in response or []:
+        for message_id, fields in messages:
+            return _to_lease(redis_client, message_id, fields)
+    return None
+
+
+def ack(redis_client, lease):
+    """Mark a job done and drop it from the stream"""
+    pipe = redis_client.pipeline()
+    pipe.xack(STREAM_KEY, CONSUMER_GROUP, lease.message_id)
+    pipe.xdel(STREAM_KEY, lease.message_id)
+    pipe.execute()
+
+
+def dead_letter(redis_client, lease, reason):
+    """Move a job that keeps failing to the dead-letter stream"""
+    redis_client.xadd(DEAD_LETTER_KEY, {
+        'job': json.dumps(lease.job_data),
+        'message_id': lease.message_id,
+        'deliveries': lease.deliveries,
+        'reason': reason
+    })
+    ack(redis_client, lease)
+    logger.error(f"Job {lease.message_id} dead-lettered after {lease.deliveries} deliveries: {reason}")
+
+
+@contextmanager
+def keep_alive(redis_client, lease, consumer):
+    """Heartbeat a lease while its job runs so it is not reclaimed as stalled"""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(JOB_HEARTBEAT_INTERVAL):
+            try:
+                # Re-claiming our own message resets its idle time
+                redis_client.xclaim(STREAM_KEY, CONSUMER_GROUP, consumer, 0, [lease.message_id], justid=True)
+            except Exception as e:
+                logger.warning(f"Heartbeat failed for job {lease.message_id}: {e}")
+
+    thread = threading.Thread(target=beat, name="job-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield lease
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,74 @@
+"""Per-job state tracking in Redis hashes"""
+
+import os
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# queued -> loading -> warmup -> pass (k/5) -> scoring -> done | failed
+QUEUED = 'queued'
+LOADING = 'loading'
+WARMUP = 'warmup'
+PASS = 'pass'
+SCORING = 'scoring'
+DONE = 'done'
+FAILED = 'failed'
+
+STATES = (QUEUED, LOADING, WARMUP, PASS, SCORING, DONE, FAILED)
+FINAL_STATES = (DONE, FAILED)
+
+# Finished jobs keep their state as long as their result hash lives
+JOB_STATE_TTL = int(os.getenv('JOB_STATE_TTL', 7200))  # seconds
+
+
+def job_key(submission_id):
+    return f'job:{submission_id}'
+
+
+def events_channel(submission_id):
+    """Pub/sub channel on which every state transition of a job is announced"""
+    return f'job-events:{submission_id}'
+
+
+def set_state(redis_client, submission_id, state, **fields):
+    """Record a state transition with its timestamp, plus any extra fields (e.g. pass=3)"""
+    if state not in STATES:
+        raise ValueError(f"Unknown job state: {state}")
+
+    now = time.time()
+    mapping = {'state': state, f'{state}_at': now, 'updated_at': now}
+    mapping.update({k: v for k, v in fields.items() if v is not None})
+
+    key = job_key(submission_id)
+    pipe = redis_client.pipeline()
+    pipe.hset(key, mapping=mapping)
+    if state in FINAL_STATES:
+        pipe.expire(key, JOB_STATE_TTL)
+    # Wake up long-poll / SSE clients waiting on this job
+    pipe.publish(events_channel(submission_id), json.dumps({'state': state, **fields}))
+    pipe.execute()
+
+
+def get_state(redis_client, submission_id):
+    """Return the job's state hash (empty dict if unknown), with timestamps as floats"""
+    job = redis_client.hgetall(job_key(submission_id))
+    for key, value in job.items():
+        if key.endswith('_at'):
+            job[key] = float(value)
+    for key in ('pass', 'passes'):
+        if key in job:
+            job[key] = int(job[key])
+    return job
+
+
+def progress_reporter(redis_client, submission_id, worker_id):
+    """Callback for evaluate_model(progress=...) that writes state transitions to Redis"""
+    def report(state, **fields):
+        try:
+            set_state(redis_client, submission_id, state, worker_id=worker_id, **fields)
+        except Exception as e:
+            # Progress reporting must never fail an evaluation
+            logger.warning(f"Failed to record state {state} for {submission_id}: {e}")
+    return report
@@ -0,0 +1,266 @@
+"""Lifecycle of uploaded model files: references held by jobs and team bests, deletion once unreferenced"""
+
+import os
+import time
+import logging
+
+import artifact_storage
+
+logger = logging.getLogger(__name__)
+
+# Disk budget of the model store; unreferenced models are evicted oldest-first above it
+MODEL_STORE_BUDGET_MB = float(os.getenv('MODEL_STORE_BUDGET_MB', 20 * 1024))
+MODEL_GC_INTERVAL = int(os.getenv('MODEL_GC_INTERVAL', 60))  # seconds
+# Newly stored models are never collected before their job has referenced them
+MODEL_GC_GRACE = int(os.getenv('MODEL_GC_GRACE', 600))  # seconds
+
+# model_path -> time it was stored (or last uploaded again)
+ARTIFACTS_KEY = 'models:artifacts'
+# model_path -> size in bytes
+ARTIFACT_SIZES_KEY = 'models:sizes'
+# Eviction counters
+STATS_KEY = 'models:stats'
+
+# model_path -> number of queued or running jobs using it
+JOB_REFS_KEY = 'models:job_refs'
+# model_path -> number of teams whose best model it is (kept by results_store.update_team_best)
+BEST_REFS_KEY = 'models:best_refs'
+# Model paths that may have lost their last reference
+DELETE_QUEUE_KEY = 'models:delete_queue'
+# model_path -> time a deleter claimed it; no reference can be taken until the file is gone
+DELETING_KEY = 'models:deleting'
+# A claim older than this is from a deleter that died mid-way and no longer blocks references
+MODEL_DELETE_TIMEOUT = int(os.getenv('MODEL_DELETE_TIMEOUT', 300))  # seconds
+
+
+def register_artifact(redis_client, model_path, size, stored_at=None):
+    """Add a model file to the store's inventory (again, for a re-upload of the same content)"""
+    pipe = redis_client.pipeline()
+    pipe.zadd(ARTIFACTS_KEY, {str(model_path): stored_at or time.time()})
+    pipe.hset(ARTIFACT_SIZES_KEY, str(model_path), size)
+    pipe.execute()
+
+
+# Claim an unreferenced model for deletion. Refused while a job or a team best
+# refers to it, or when it was (re-)registered after the grace cutoff; once
+# claimed, add_job_ref refuses new references until the deleter is done.
+_CLAIM_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 1 or redis.call('HEXISTS', KEYS[2], ARGV[1]) == 1 then
+    return 0
+end
+local stored_at = redis.call('ZSCORE', KEYS[3], ARGV[1])
+if stored_at and tonumber(stored_at) > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('HSET', KEYS[4], ARGV[1], ARGV[3])
+return 1
+"""
+
+
+def _recently_modified(model_path, cutoff):
+    try:
+        return os.stat(model_path).st_mtime > cutoff
+    except FileNotFoundError:
+        return False
+
+
+def _claim(redis_client, model_path, cutoff):
+    """Atomically check a model is unreferenced and outside the grace window, and mark it as being deleted"""
+    if _recently_modified(model_path, cutoff):
+        return False
+    claim_script = redis_client.register_script(_CLAIM_SCRIPT)
+    return bool(claim_script(keys=[JOB_REFS_KEY, BEST_REFS_KEY, ARTIFACTS_KEY, DELETING_KEY],
+                             args=[model_path, cutoff, time.time()]))
+
+
+def _remove_artifact(redis_client, model_path, reason):
+    """Delete a claimed model file and forget it, then release the claim; returns the bytes freed"""
+    size = int(redis_client.hget(ARTIFACT_SIZES_KEY, model_path) or 0)
+    try:
+        try:
+            os.remove(model_path)
+            logger.info(f"Deleted model ({reason}): {model_path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to delete model file {model_path}: {e}")
+            return 0
+
+        storage = artifact_storage.get_storage()
+        if storage.remote:
+            # Nothing refers to it any more - drop the shared copy too
+            try:
+                storage.delete(artifact_storage.model_hash_of(model_path))
+            except Exception as e:
+                logger.warning(f"Failed to delete {model_path} from artifact storage: {e}")
+
+        pipe = redis_client.pipeline()
+        pipe.zrem(ARTIFACTS_KEY, model_path)
+        pipe.hdel(ARTIFACT_SIZES_KEY, model_path)
+        pipe.hincrby(STATS_KEY, f'{reason}_count', 1)
+        pipe.hincrby(STATS_KEY, f'{reason}_bytes', size)
+        pipe.execute()
+        return size
+    finally:
+        redis_client.hdel(DELETING_KEY, model_path)
+
+
+# Take a job reference unless a deleter has claimed the model (and is not presumed dead)
+_ADD_JOB_REF_SCRIPT = """
+local claimed_at = redis.call('HGET', KEYS[2], ARGV[1])
+if claimed_at and tonumber(claimed_at) > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+return 1
+"""
+
+
+def add_job_ref(redis_client, model_path):
+    """
+    A job that will read this model was scheduled. Returns False, taking no
+    reference, while the model is being deleted: the file is about to go and
+    must be stored again once is_being_deleted() turns False.
+    """
+    add_ref_script = redis_client.register_script(_ADD_JOB_REF_SCRIPT)
+    return bool(add_ref_script(keys=[JOB_REFS_KEY, DELETING_KEY],
+                               args=[str(model_path), time.time() - MODEL_DELETE_TIMEOUT]))
+
+
+def is_being_deleted(redis_client, model_path):
+    claimed_at = redis_client.hget(DELETING_KEY, str(model_path))
+    return claimed_at is not None and float(claimed_at) > time.time() - MODEL_DELETE_TIMEOUT
+
+
+# Drop one job reference; a model nothing refers to any more is queued for deletion
+_RELEASE_SCRIPT = """
+if redis.call('HINCRBY', KEYS[1], ARGV[1], -1) > 0 then
+    return 0
+end
+redis.call('HDEL', KEYS[1], ARGV[1])
+if redis.call('HEXISTS', KEYS[2], ARGV[1]) == 1 then
+    return 0
+end
+redis.call('LPUSH', KEYS[3], ARGV[1])
+return 1
+"""
+
+
+def release_job_ref(redis_client, model_path):
+    """A job using this model finished (or was given up on)"""
+    if not model_path:
+        return
+    release_script = redis_client.register_script(_RELEASE_SCRIPT)
+    release_script(keys=[JOB_REFS_KEY, BEST_REFS_KEY, DELETE_QUEUE_KEY], args=[str(model_path)])
+
+
+def queue_deletion(redis_client, model_path):
+    """Ask for a model to be deleted once no job or team best refers to it"""
+    redis_client.lpush(DELETE_QUEUE_KEY, str(model_path))
+
+
+def is_referenced(redis_client, model_path):
+    pipe = redis_client.pipeline()
+    pipe.hexists(JOB_REFS_KEY, str(model_path))
+    pipe.hexists(BEST_REFS_KEY, str(model_path))
+    return any(pipe.execute())
+
+
+def drain_deletions(redis_client, limit=100):
+    """Delete queued models that are still unreferenced; returns how many were removed"""
+    cutoff = time.time() - MODEL_GC_GRACE
+    removed = 0
+    deferred = []
+    for _ in range(limit):
+        model_path = redis_client.rpop(DELETE_QUEUE_KEY)
+        if model_path is None:
+            break
+        if is_referenced(redis_client, model_path):
+            # Picked up again by a new job or became a team best - its last release re-queues it
+            continue
+        if not _claim(redis_client, model_path, cutoff):
+            # Uploaded again within the grace window (or referenced since the check above)
+            if not is_referenced(redis_client, model_path):
+                deferred.append(model_path)
+            continue
+        _remove_artifact(redis_client, model_path, 'deleted')
+        removed += 1
+    if deferred:
+        # Looked at again on a later pass, once the grace window is over
+        redis_client.lpush(DELETE_QUEUE_KEY, *deferred)
+    return removed
+
+
+def sync_inventory(redis_client, model_dir):
+    """Register model files found on disk but not tracked (e.g. from older versions) and forget vanished ones"""
+    on_disk = {}
+    for entry in os.scandir(model_dir):
+        if entry.is_file() and entry.name.endswith('.onnx'):
+            on_disk[entry.path] = entry.stat()
+
+    tracked = set(redis_client.zrange(ARTIFACTS_KEY, 0, -1))
+    being_deleted = set(redis_client.hkeys(DELETING_KEY))
+    for path, stat in on_disk.items():
+        if path not in tracked and path not in being_deleted:
+            register_artifact(redis_client, path, stat.st_size, stored_at=stat.st_mtime)
+    vanished = tracked - set(on_disk)
+    if vanished:
+        pipe = redis_client.pipeline()
+        pipe.zrem(ARTIFACTS_KEY, *vanished)
+        pipe.hdel(ARTIFACT_SIZES_KEY, *vanished)
+        pipe.execute()
+
+
+def store_bytes(redis_client):
+    return sum(int(size) for size in redis_client.hvals(ARTIFACT_SIZES_KEY))
+
+
+def collect_garbage(redis_client, model_dir):
+    """
+    One GC pass: delete queued models, then evict unreferenced models, oldest
+    first, until the store fits its budget. Returns the number of evictions.
+    """
+    sync_inventory(redis_client, model_dir)
+    drain_deletions(redis_client)
+
+    budget = MODEL_STORE_BUDGET_MB * 1024 * 1024
+    used = store_bytes(redis_client)
+    evicted = 0
+    if used <= budget:
+        return evicted
+
+    cutoff = time.time() - MODEL_GC_GRACE
+    for model_path in redis_client.zrangebyscore(ARTIFACTS_KEY, '-inf', cutoff):
+        if used <= budget:
+            break
+        if redis_client.zscore(ARTIFACTS_KEY, model_path) is None or not _claim(redis_client, model_path, cutoff):
+            # Deleted, uploaded again or picked up by a job since the scan started
+            continue
+        used -= _remove_artifact(redis_client, model_path, 'evicted')
+        evicted += 1
+
+    if used > budget:
+        logger.warning(f"Model store over budget ({used / 1024**2:.0f}MB > {MODEL_STORE_BUDGET_MB:.0f}MB) with only referenced models left")
+    return evicted
+
+
+def stats(redis_client):
+    """Size of the store and what GC has removed so far"""
+    counters = redis_client.hgetall(STATS_KEY)
+    return {
+        'models': redis_client.zcard(ARTIFACTS_KEY),
+        'size_mb': round(store_bytes(redis_client) / 1024**2, 1),
+        'budget_mb': MODEL_STORE_BUDGET_MB,
+        'referenced_by_jobs': redis_client.hlen(JOB_REFS_KEY),
+        'team_bests': redis_client.hlen(BEST_REFS_KEY),
+        'pending_deletions': redis_client.llen(DELETE_QUEUE_KEY),
+        'deleted': int(counters.get('deleted_count', 0)),
+        'evicted': int(counters.get('evicted_count', 0)),
+        'evicted_mb': round(int(counters.get('evicted_bytes', 0)) / 1024**2, 1),
+    }
+
+
+def is_full(redis_client):
+    """True when the store is over budget (GC could not free enough space)"""
+    return store_bytes(redis_client) > MODEL_STORE_BUDGET_MB * 1024 * 1024
@@ -1,14 +1,18 @@
 """Queue and job processing with Redis"""
 
-import os
-import json
 import time
 import redis
-import requests
 import logging
 
-from evaluator import evaluate_model
+from evaluator import evaluate_model, execution_provider
+from data_loader import PUBLIC_DATASET, PRIVATE_DATASET, dataset_for_path, dataset_version
 from scorer import calculate_score
+import artifact_storage
+import cost_model
+import eval_cache
+import job_state
+import model_store
+import results_store
 
 logger = logging.getLogger(__name__)
 
@@ -18,105 +22,82 @@ def get_redis_client(host, port):
     return redis.Redis(host=host, port=port, db=0, decode_responses=True)
 
 
-def get_team_best_score(redis_client, team_id):
-    """Get the best score for a team from Redis"""
-    try:
-        best_score_key = f'team:{team_id}:best_score'
-        best_score = redis_client.get(best_score_key)
-        return float(best_score) if best_score else None
-    except:
-        return None
-
-
 def update_team_best_model(redis_client, team_id, submission_id, score, model_path):
-    """Update team's best model, delete old best if new one is better"""
+    """Record the model if it is the team's best; whatever it displaces is queued for deletion"""
     try:
-        best_score_key = f'team:{team_id}:best_score'
-        best_model_key = f'team:{team_id}:best_model'
-        best_submission_key = f'team:{team_id}:best_submission'
-        
-        current_best_score = redis_client.get(best_score_key)
-        current_best_model = redis_client.get(best_model_key)
-        
-        if current_best_score is None:
-            # First submission for this team
-            redis_client.set(best_score_key, score)
-            redis_client.set(best_model_key, model_path)
-            redis_client.set(best_submission_key, submission_id)
-            logger.info(f"Team {team_id}: First submission, keeping model at {model_path}")
-            return True  # Keep this model
-        else:
-            current_best_score = float(current_best_score)
-            
-            if score > current_best_score:
-                # New model is better - delete old best, keep new
-                
-                # Update to new best
-                redis_client.set(best_score_key, score)
-                redis_client.set(best_model_key, model_path)
-                redis_client.set(best_submission_key, submission_id)
-                return True  # Keep this model
-            else:
-                # Current model is not better - delete it
-                return True  # Delete this model
-                
+        is_best, displaced = results_store.update_team_best(redis_client, team_id, score, model_path, submission_id)
+        if is_best:
+            logger.info(f"Team {team_id}: new best model {submission_id} ({score:.2f})")
+        if displaced:
+            model_store.queue_deletion(redis_client, displaced)
+        return is_best
     except Exception as e:
         logger.error(f"Error managing team best model: {e}")
-        return False  # Delete on error to be safe
+        return False
 
 
-def send_results_to_cpu(result, cpu_server_url, secret_key):
-    """Send evaluation results to CPU server"""
-    try:
-        callback_data = {
-            'submission_id': result['submission_id'],
-            'team_id': result.get('team_id'),
-            'task_id': 2,
-            'status': result['status'],
-            'score': result.get('score', 0),
-            'is_private': result.get('is_private', False),
-            'details': result.get('details', {}),
-            'timestamp': result['timestamp']
-        }
-        
-        response = requests.post(
-            f"{cpu_server_url}/api/gpu-callback/result",
-            json=callback_data,
-            headers={'X-GPU-Secret': secret_key},
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            logger.info(f"Results sent to CPU server for {result['submission_id']}")
-        else:
-            logger.warning(f"Failed to send results to CPU: {response.status_code}")
-            
-    except Exception as e:
-        logger.error(f"Error sending results to CPU server: {e}")
-
-
-def process_job(job_data, redis_client, worker_id, batch_size, gpu_memory_fraction, cpu_server_url, secret_key):
+def process_job(job_data, redis_client, worker_id, batch_size, gpu_memory_fraction, callback_sender):
     """Process a single evaluation job"""
     try:
         submission_id = job_data['submission_id']
         team_id = job_data.get('team_id')
         model_path = job_data['model_path']
+        # Where this worker can read the model (fetched from remote storage if needed)
+        local_model_path = artifact_storage.resolve_model_path(job_data)
         batch_size_override = job_data.get('batch_size', batch_size)
         
         # Check if this is a private evaluation based on task field
         task_type = job_data.get('task', 'task2')
         is_private = task_type == 'task2_private'
         
-        # Set test data path based on private flag
+        # Test set by id from the allowlist - private jobs always run on the private set
         if is_private:
-            test_data_path = '/app/data/test_data/private_test'
+            dataset = PRIVATE_DATASET
+        elif 'dataset' in job_data:
+            dataset = job_data['dataset']
+        elif 'test_data_path' in job_data:
+            # Queued before jobs named their test set by id
+            dataset = dataset_for_path(job_data['test_data_path'])
         else:
-            test_data_path = job_data.get('test_data_path', '/app/data/test_data/public_test')
-        
-        logger.info(f"Processing submission {submission_id} on test set: {test_data_path} (private={is_private})")
-        
-        # Evaluate model
-        results = evaluate_model(model_path, test_data_path, batch_size_override, gpu_memory_fraction)
+            dataset = PUBLIC_DATASET
+        
+        logger.info(f"Processing submission {submission_id} on test set: {dataset} (private={is_private})")
+        
+        # Byte-identical models evaluated before under the same conditions are answered from cache
+        cache_key = None
+        cached = None
+        if job_data.get('model_hash'):
+            cache_key = eval_cache.cache_key(
+                job_data['model_hash'], dataset_version(dataset), batch_size_override, execution_provider()
+            )
+            cached = eval_cache.get(redis_client, cache_key)
+        
+        progress = job_state.progress_reporter(redis_client, submission_id, worker_id)
+        if cached and not eval_cache.EVAL_CACHE_RETIME:
+            logger.info(f"Submission {submission_id}: identical model already evaluated, using cached results")
+            results = dict(cached, cache_hit=True)
+        elif cached:
+            # Fresh timing, accuracy from the cache
+            timing = evaluate_model(
+                local_model_path, dataset, batch_size_override, gpu_memory_fraction,
+                progress=progress, measure_accuracy=False
+            )
+            results = dict(timing, cache_hit=True, **{k: cached[k] for k in eval_cache.ACCURACY_FIELDS if k in cached})
+        else:
+            # Evaluate model, publishing each stage to the job's state hash
+            eval_start = time.perf_counter()
+            results = evaluate_model(local_model_path, dataset, batch_size_override, gpu_memory_fraction, progress=progress)
+            
+            # Teach the scheduler's cost model how long this model really took
+            eval_duration = time.perf_counter() - eval_start
+            cost_model.record_duration(redis_client, team_id, job_data.get('flops'), eval_duration)
+            cost_model.record_worker_speed(redis_client, worker_id, job_data.get('predicted_duration'), eval_duration)
+            
+            if cache_key:
+                # Filed under the provider the session really ran on (e.g. a CPU fallback)
+                eval_cache.put(redis_client, eval_cache.cache_key(
+                    job_data['model_hash'], dataset_version(dataset), batch_size_override, results['execution_provider']
+                ), results)
         
         # Calculate final score
         score = calculate_score(results)
@@ -124,6 +105,8 @@ def process_job(job_data, redis_client, worker_id, batch_size, gpu_memory_fracti
         # Store results
         result = {
             'submission_id': submission_id,
+            'original_submission_id': job_data.get('original_submission_id'),
+            'filename': job_data.get('original_filename'),
             'team_id': team_id,
             'worker_id': worker_id,
             'score': score,
@@ -134,62 +117,50 @@ def process_job(job_data, redis_client, worker_id, batch_size, gpu_memory_fracti
         }
         
         # Save to Redis results
-        redis_client.hset(
-            f'result:{submission_id}',
-            mapping={k: json.dumps(v) if isinstance(v, (dict, list)) else str(v) for k, v in result.items()}
-        )
-        redis_client.expire(f'result:{submission_id}', 7200)  # Expire after 2 hours
+        results_store.store_result(redis_client, result)
         
-        # Send results to CPU server
-        send_results_to_cpu(result, cpu_server_url, secret_key)
+        job_state.set_state(redis_client, submission_id, job_state.DONE, score=score)
         
-        # Manage model storage - keep only best per team
-        if team_id:
-            keep_model = update_team_best_model(redis_client, team_id, submission_id, score, model_path)
-            
-            if not keep_model:
-                # Delete this model (not the best)
-                try:
-                    if os.path.exists(model_path):
-                        os.remove(model_path)
-                        logger.info(f"Deleted model: {model_path}")
-                except Exception as e:
-                    logger.warning(f"Failed to delete model file: {e}")
-        else:
-            # No team_id, delete by default
-            try:
-                if os.path.exists(model_path):
-                    os.remove(model_path)
-                    logger.warning(f"No team_id, deleted model: {model_path}")
-            except Exception as e:
-                logger.warning(f"Failed to delete model file: {e}")
+        # Send results to CPU server (delivered in the background)
+        callback_sender.send(result)
+        
+        # Manage model storage - keep only the best per team (private re-evaluations
+        # run on a team's best model and must not affect it)
+        if team_id and not is_private:
+            update_team_best_model(redis_client, team_id, submission_id, score, model_path)
+        elif not is_private:
+            # No team_id, delete once no other job uses it
+            model_store.queue_deletion(redis_client, model_path)
         
         logger.info(f"Submission {submission_id} completed with score: {score:.2f}")
         return result
         
     except Exception as e:
         logger.error(f"Job processing failed: {e}", exc_info=True)
-        
-        # Store error result
-        task_type = job_data.get('task', 'task2')
-        is_private = task_type == 'task2_private'
-        
-        error_result = {
-            'submission_id': job_data.get('submission_id', 'unknown'),
-            'team_id': job_data.get('team_id'),
-            'worker_id': worker_id,
-            'status': 'failed',
-            'error': str(e),
-            'is_private': is_private,
-            'timestamp': time.time()
-        }
-        
-        redis_client.hset(
-            f'result:{job_data.get("submission_id", "unknown")}',
-            mapping={k: str(v) for k, v in error_result.items()}
-        )
-        
-        # Send error results to CPU server
-        send_results_to_cpu(error_result, cpu_server_url, secret_key)
-        
-        return error_result
+        return record_failure(job_data, redis_client, worker_id, callback_sender, str(e))
+
+
+def record_failure(job_data, redis_client, worker_id, callback_sender, error):
+    """Store a failed result for a job and report it to the CPU server"""
+    task_type = job_data.get('task', 'task2')
+    is_private = task_type == 'task2_private'
+    
+    error_result = {
+        'submission_id': job_data.get('submission_id', 'unknown'),
+        'original_submission_id': job_data.get('original_submission_id'),
+        'filename': job_data.get('original_filename'),
+        'team_id': job_data.get('team_id'),
+        'worker_id': worker_id,
+        'status': 'failed',
+        'error': error,
+        'is_private': is_private,
+        'timestamp': time.time()
+    }
+    
+    results_store.store_result(redis_client, error_result)
+    job_state.set_state(redis_client, error_result['submission_id'], job_state.FAILED, error=error)
+    
+    # Send error results to CPU server
+    callback_sender.send(error_result)
+    
+    return error_result
@@ -0,0 +1,150 @@
+"""Evaluation results and team best models in Redis, indexed so they can be read without KEYS scans"""
+
+import os
+import json
+import math
+import time
+import logging
+
+import model_store
+
+logger = logging.getLogger(__name__)
+
+# Result hashes by submission id, scored by completion time
+RESULTS_INDEX_KEY = 'results:recent'
+# team_id -> JSON {score, model_path, submission_id}
+TEAM_BEST_KEY = 'teams:best'
+
+RESULT_TTL = int(os.getenv('RESULT_TTL', 7200))  # seconds
+
+
+def result_key(submission_id):
+    return f'result:{submission_id}'
+
+
+def store_result(redis_client, result):
+    """Save a finished job's result hash and index it by completion time"""
+    submission_id = result['submission_id']
+    timestamp = float(result.get('timestamp') or time.time())
+
+    pipe = redis_client.pipeline()
+    pipe.hset(
+        result_key(submission_id),
+        mapping={k: json.dumps(v) if isinstance(v, (dict, list)) else str(v) for k, v in result.items()}
+    )
+    pipe.expire(result_key(submission_id), RESULT_TTL)
+    pipe.zadd(RESULTS_INDEX_KEY, {submission_id: timestamp})
+    # Drop index entries whose result hash has expired
+    pipe.zremrangebyscore(RESULTS_INDEX_KEY, '-inf', time.time() - RESULT_TTL)
+    pipe.execute()
+
+
+def recent_results(redis_client, limit=10):
+    """Most recent results first, read in one round trip for the index and one for the hashes"""
+    submission_ids = redis_client.zrevrange(RESULTS_INDEX_KEY, 0, limit - 1)
+
+    pipe = redis_client.pipeline()
+    for submission_id in submission_ids:
+        pipe.hgetall(result_key(submission_id))
+    return [result for result in pipe.execute() if result]
+
+
+def delete_result(redis_client, submission_id):
+    """Remove a result and its index entry; returns True if the result existed"""
+    pipe = redis_client.pipeline()
+    pipe.delete(result_key(submission_id))
+    pipe.zrem(RESULTS_INDEX_KEY, submission_id)
+    deleted, _ = pipe.execute()
+    return bool(deleted)
+
+
+def get_team_best(redis_client, team_id):
+    """The team's best model as {score, model_path, submission_id}, or None"""
+    entry = redis_client.hget(TEAM_BEST_KEY, team_id)
+    return json.loads(entry) if entry else None
+
+
+# Compare-and-set of a team's best model, also moving the model's best reference.
+# Returns {1, previous best path or nil} when the model became the best,
+# {0, its own path} when it did not - either way the returned path is displaced.
+# A NaN score is refused and otherwise only a strictly higher score wins; a
+# non-finite best stored by an older version is replaced by any finite score.
+_UPDATE_BEST_SCRIPT = """
+local score = tonumber(ARGV[2])
+if not score or score ~= score then
+    return {0, ARGV[3]}
+end
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+local displaced = false
+if current then
+    local best = cjson.decode(current)
+    local best_score = tonumber(best.score)
+    local best_finite = best_score and best_score == best_score and math.abs(best_score) ~= math.huge
+    if best_finite and not (score > best_score) then
+        return {0, ARGV[3]}
+    end
+    displaced = best.model_path
+end
+
+redis.call('HSET', KEYS[1], ARGV[1], cjson.encode({
+    score = score, model_path = ARGV[3], submission_id = ARGV[4]
+}))
+redis.call('HINCRBY', KEYS[2], ARGV[3], 1)
+if displaced and redis.call('HINCRBY', KEYS[2], displaced, -1) <= 0 then
+    redis.call('HDEL', KEYS[2], displaced)
+end
+return {1, displaced}
+"""
+
+
+def update_team_best(redis_client, team_id, score, model_path, submission_id):
+    """
+    Atomically make a model the team's best if it beats the current one.
+    Returns (is_new_best, displaced_model_path); the displaced path is the
+    previous best, or this model itself when it is not better (None for a
+    team's first model). A non-finite score (NaN RMSE, or a score formula
+    overflowing for a very slow model) is never a best.
+    """
+    if not math.isfinite(score):
+        logger.warning(f"Team {team_id}: not considering non-finite score {score} as a best model")
+        return False, str(model_path)
+    update_script = redis_client.register_script(_UPDATE_BEST_SCRIPT)
+    is_best, displaced = update_script(
+        keys=[TEAM_BEST_KEY, model_store.BEST_REFS_KEY],
+        args=[team_id, score, str(model_path), submission_id]
+    )
+    return bool(is_best), displaced
+
+
+def all_team_bests(redis_client):
+    """{team_id: {score, model_path, submission_id}} for every team, in a single read"""
+    return {team_id: json.loads(entry) for team_id, entry in redis_client.hgetall(TEAM_BEST_KEY).items()}
+
+
+def migrate_legacy_team_bests(redis_client):
+    """
+    Fold per-team team:{id}:best_* keys written by older versions into the
+    team best hash. Runs once per deployment (SCAN, not KEYS, so Redis never blocks).
+    """
+    migrated = 0
+    for key in redis_client.scan_iter(match='team:*:best_model', count=500):
+        team_id = key.split(':')[1]
+        pipe = redis_client.pipeline()
+        pipe.get(f'team:{team_id}:best_score')
+        pipe.get(f'team:{team_id}:best_model')
+        pipe.get(f'team:{team_id}:best_submission')
+        score, model_path, submission_id = pipe.execute()
+
+        try:
+            score = float(score or 0)
+        except ValueError:
+            # Left in place for a look by hand; it must not stop the other teams' migration
+            logger.error(f"Skipping legacy best model of team {team_id}: bad score {score!r}")
+            continue
+        if model_path and not redis_client.hexists(TEAM_BEST_KEY, team_id):
+            update_team_best(redis_client, team_id, score, model_path, submission_id or '')
+            migrated += 1
+        redis_client.delete(f'team:{team_id}:best_score', f'team:{team_id}:best_model', f'team:{team_id}:best_submission')
+
+    if migrated:
+        logger.info(f"Migrated best models of {migrated} team(s) to {TEAM_BEST_KEY}")
@@ -29,6 +29,58 @@ def calculate_rmse(predictions, ground_truth):
     return float(rmse)
 
 
+class RMSEAccumulator:
+    """
+    RMSE against ground truth accumulated batch by batch, in float64, so only
+    one batch of predictions is ever held. Also tracks each sample's RMSE and
+    the mean / std of all predicted depths.
+    
+    Predictions are expected normalized to [0, 1] (as evaluate_model does), so
+    ground truth is rescaled exactly when calculate_rmse would rescale it.
+    """
+    
+    def __init__(self, ground_truth):
+        self.ground_truth = ground_truth
+        self.ground_truth_scale = 255.0 if ground_truth.max() > 1.0 else 1.0
+        self.per_sample_mse = np.full(len(ground_truth), np.nan)
+        self.squared_error = 0.0
+        self.depth_sum = 0.0
+        self.depth_sum_sq = 0.0
+        self.count = 0
+    
+    def update(self, predictions, offset):
+        """Add the predictions for samples offset .. offset + len(predictions)"""
+        if len(predictions.shape) == 4 and predictions.shape[1] == 1:
+            predictions = predictions[:, 0]
+        ground_truth = self.ground_truth[offset:offset + len(predictions)]
+        if predictions.shape != ground_truth.shape:
+            raise ValueError(f"Shape mismatch - predictions: {predictions.shape}, ground_truth: {ground_truth.shape}")
+        
+        predictions = predictions.astype(np.float64)
+        squared_error = np.square(predictions - ground_truth.astype(np.float64) / self.ground_truth_scale)
+        per_sample_sum = squared_error.reshape(len(predictions), -1).sum(axis=1)
+        pixels_per_sample = squared_error[0].size
+        
+        self.per_sample_mse[offset:offset + len(predictions)] = per_sample_sum / pixels_per_sample
+        self.squared_error += float(per_sample_sum.sum())
+        self.depth_sum += float(predictions.sum())
+        self.depth_sum_sq += float(np.square(predictions).sum())
+        self.count += predictions.size
+    
+    def rmse(self):
+        return float(np.sqrt(self.squared_error / self.count))
+    
+    def per_sample_rmse(self):
+        return [float(np.sqrt(mse)) for mse in self.per_sample_mse]
+    
+    def mean_depth(self):
+        return self.depth_sum / self.count
+    
+    def std_depth(self):
+        mean = self.mean_depth()
+        return float(np.sqrt(max(self.depth_sum_sq / self.count - mean * mean, 0.0)))
+
+
 def calculate_score(results):
     """Calculate final score based on accuracy, model size, and inference time"""
     # Score formula: accuracy_score * size_score * speed_score
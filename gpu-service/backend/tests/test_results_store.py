@@ -0,0 +1,64 @@
+"""Team best model updates: only a strictly better, finite score replaces the current best"""
+
+import os
+import sys
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')  # Lua scripting in fakeredis
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_store  # noqa: E402
+import results_store  # noqa: E402
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def test_better_score_displaces_previous_best(redis_client):
+    assert results_store.update_team_best(redis_client, '7', 0.5, '/models/a.onnx', 'sub_a') == (True, None)
+    assert results_store.update_team_best(redis_client, '7', 0.6, '/models/b.onnx', 'sub_b') == (True, '/models/a.onnx')
+    assert results_store.get_team_best(redis_client, '7')['model_path'] == '/models/b.onnx'
+    assert redis_client.hgetall(model_store.BEST_REFS_KEY) == {'/models/b.onnx': '1'}
+
+
+def test_equal_score_does_not_replace_best(redis_client):
+    results_store.update_team_best(redis_client, '7', 0.5, '/models/a.onnx', 'sub_a')
+    assert results_store.update_team_best(redis_client, '7', 0.5, '/models/b.onnx', 'sub_b') == (False, '/models/b.onnx')
+    assert results_store.get_team_best(redis_client, '7')['model_path'] == '/models/a.onnx'
+
+
+@pytest.mark.parametrize('score', [float('nan'), float('inf'), float('-inf')])
+def test_non_finite_score_never_becomes_best(redis_client, score):
+    results_store.update_team_best(redis_client, '7', 0.5, '/models/a.onnx', 'sub_a')
+
+    is_best, displaced = results_store.update_team_best(redis_client, '7', score, '/models/nan.onnx', 'sub_nan')
+
+    assert not is_best
+    # The rejected model is what gets deleted - never the team's best
+    assert displaced == '/models/nan.onnx'
+    assert results_store.get_team_best(redis_client, '7')['model_path'] == '/models/a.onnx'
+    assert redis_client.hgetall(model_store.BEST_REFS_KEY) == {'/models/a.onnx': '1'}
+
+
+def test_nan_score_in_script_is_rejected(redis_client):
+    """The Lua comparison itself must not let NaN through (e.g. a caller skipping the Python check)"""
+    results_store.update_team_best(redis_client, '7', 0.5, '/models/a.onnx', 'sub_a')
+    update_script = redis_client.register_script(results_store._UPDATE_BEST_SCRIPT)
+
+    is_best, displaced = update_script(
+        keys=[results_store.TEAM_BEST_KEY, model_store.BEST_REFS_KEY],
+        args=['7', 'nan', '/models/nan.onnx', 'sub_nan']
+    )
+
+    assert (is_best, displaced) == (0, '/models/nan.onnx')
+    assert results_store.get_team_best(redis_client, '7')['model_path'] == '/models/a.onnx'
+
+
+def test_first_nan_score_does_not_become_best(redis_client):
+    assert results_store.update_team_best(redis_client, '7', float('nan'), '/models/nan.onnx', 'sub_nan') == (False, '/models/nan.onnx')
+    assert results_store.get_team_best(redis_client, '7') is None
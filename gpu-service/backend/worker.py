@@ -3,10 +3,15 @@
 import os
 import sys
 import time
-import json
+import socket
 import logging
 
-from queue_handler import get_redis_client, process_job
+from queue_handler import get_redis_client, process_job, record_failure
+from job_queue import JOB_MAX_DELIVERIES, ensure_consumer_group, migrate_legacy_queue, claim_next, ack, dead_letter, keep_alive
+from callback_sender import CallbackSender
+import cost_model
+import data_loader
+import model_store
 
 # Configure logging
 logging.basicConfig(
@@ -19,15 +24,34 @@ logger = logging.getLogger(__name__)
 REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
 REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
 WORKER_ID = os.getenv('WORKER_ID', '0')
+# Unique per worker process - WORKER_ID is shared by every replica of a scaled service
+WORKER_INSTANCE_ID = f"{WORKER_ID}-{socket.gethostname()}-{os.getpid()}"
 GPU_MEMORY_FRACTION = float(os.getenv('GPU_MEMORY_FRACTION', 0.143))
 BATCH_SIZE = int(os.getenv('BATCH_SIZE', 8))
 CPU_SERVER_URL = os.getenv('CPU_SERVER_URL', 'https://mls-goat.eastus2.cloudapp.azure.com')
 GPU_SCORER_SECRET_KEY = os.getenv('GPU_SCORER_SECRET_KEY')
 
 
+def release_model(redis_client, job_data):
+    """Drop the finished job's reference to its model and delete models nothing uses any more"""
+    try:
+        model_store.release_job_ref(redis_client, job_data.get('model_path'))
+        model_store.drain_deletions(redis_client)
+    except Exception as e:
+        logger.warning(f"Model cleanup failed: {e}")
+
+
+def publish_cache_stats(redis_client):
+    """Report what this worker's dataset cache holds, for /queue/status"""
+    try:
+        data_loader.publish_cache_stats(redis_client, WORKER_INSTANCE_ID)
+    except Exception as e:
+        logger.warning(f"Failed to publish dataset cache stats: {e}")
+
+
 def main():
     """Main worker loop"""
-    logger.info(f"Worker {WORKER_ID} starting...")
+    logger.info(f"Worker {WORKER_INSTANCE_ID} starting...")
     logger.info(f"GPU Memory Fraction: {GPU_MEMORY_FRACTION}")
     logger.info(f"Batch Size: {BATCH_SIZE}")
     logger.info(f"Redis Host: {REDIS_HOST}")
@@ -44,32 +68,53 @@ def main():
         logger.error(f"Redis connection failed: {e}")
         sys.exit(1)
     
+    # Results go to a Redis outbox and are delivered to the CPU server in the background
+    callback_sender = CallbackSender(redis_client, CPU_SERVER_URL, GPU_SCORER_SECRET_KEY, sender_id=WORKER_INSTANCE_ID)
+    
+    # Jobs are read from a Redis Stream consumer group: a job stays pending until
+    # acked, so one lost to a crash is reclaimed by another worker
+    ensure_consumer_group(redis_client)
+    migrate_legacy_queue(redis_client)
+    consumer = f"worker-{WORKER_INSTANCE_ID}"
+    publish_cache_stats(redis_client)
+    
     # Worker loop
     while True:
         try:
-            # Block and wait for job (BRPOP with timeout)
-            result = redis_client.brpop('evaluation_queue', timeout=5)
+            # Counts this worker in the throughput behind queue ETAs
+            cost_model.worker_alive(redis_client, WORKER_INSTANCE_ID)
+            lease = claim_next(redis_client, consumer, block_ms=5000)
+            if lease is None:
+                # Keeps an idle worker's cache stats from being taken for a gone worker's
+                publish_cache_stats(redis_client)
+                continue
             
-            if result:
-                queue_name, job_json = result
-                job_data = json.loads(job_json)
-                
-                logger.info(f"Received job: {job_data.get('submission_id', 'unknown')}")
-                
-                # Process the job
+            job_data = lease.job_data
+            logger.info(f"Received job: {job_data.get('submission_id', 'unknown')}")
+            
+            if lease.deliveries > JOB_MAX_DELIVERIES:
+                # Keeps taking its worker down - stop retrying and tell the team
+                record_failure(
+                    job_data, redis_client, WORKER_INSTANCE_ID, callback_sender,
+                    f"Evaluation aborted after {lease.deliveries - 1} failed attempts"
+                )
+                dead_letter(redis_client, lease, "max deliveries exceeded")
+                release_model(redis_client, job_data)
+                continue
+            
+            # Process the job
+            with keep_alive(redis_client, lease, consumer):
                 process_job(
                     job_data=job_data,
                     redis_client=redis_client,
-                    worker_id=WORKER_ID,
+                    worker_id=WORKER_INSTANCE_ID,
                     batch_size=BATCH_SIZE,
                     gpu_memory_fraction=GPU_MEMORY_FRACTION,
-                    cpu_server_url=CPU_SERVER_URL,
-                    secret_key=GPU_SCORER_SECRET_KEY
+                    callback_sender=callback_sender
                 )
-                
-            else:
-                # No job available, just wait
-                time.sleep(1)
+            ack(redis_client, lease)
+            release_model(redis_client, job_data)
+            publish_cache_stats(redis_client)
                 
         except KeyboardInterrupt:
             logger.info("Worker shutting down...")
@@ -55,10 +55,11 @@ def submit_model(model_name, batch_size):
         print_error(f"Submission failed: {e}")
         return None
 
-def check_status(submission_id):
-    """Check status of a submission"""
+def check_status(submission_id, wait=0):
+    """Check status of a submission (with `wait`, hold until its state changes)"""
     try:
-        response = requests.get(f"{API_URL}/submit/task2/status/{submission_id}")
+        response = requests.get(f"{API_URL}/submit/task2/status/{submission_id}",
+                                params={'wait': wait} if wait else None, timeout=wait + 10)
         return response.json()
     except Exception as e:
         return {'status': 'error', 'error': str(e)}
@@ -126,7 +127,8 @@ def full_test(model_name, batch_size):
         if pending:
             elapsed = int(time.time() - start_wait)
             print(f"  Waiting for {len(pending)} models... ({elapsed}s elapsed)", end='\r')
-            time.sleep(2)
+            # Long-poll the oldest pending job instead of sleeping - jobs mostly finish in order
+            check_status(pending[0]['id'], wait=10)
     
     # Phase 3: Analysis
     print_header("PERFORMANCE ANALYSIS")